@@ -0,0 +1,265 @@
+"""
+Microbenchmarks for the detection and capture hot paths.
+
+Runs each case against synthetic payloads of realistic and extreme sizes and
+writes a machine-readable JSON report. If a baseline report is given, any case
+whose median time grew by more than the threshold is reported as a regression
+and the script exits with status 1.
+
+Usage:
+    python benchmarks.py --output bench_results.json
+    python benchmarks.py --baseline bench_baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from queue import Queue
+
+# main.py works relative to the current directory (logs, date_alerts...), so import it
+# from a scratch directory to keep benchmark state away from the real bot's files.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+INVOCATION_DIR = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="visabot_bench_"))
+
+import main  # noqa: E402
+
+
+def make_days_payload(count, start=None, seed=0):
+    """A days-endpoint response: a list of {"date", "business_day"} objects."""
+    rng = random.Random(seed)
+    start = start or date.today() + timedelta(days=1)
+    offsets = sorted(rng.sample(range(count * 3), count))
+    return [
+        {"date": (start + timedelta(days=offset)).strftime("%Y-%m-%d"), "business_day": rng.random() > 0.1}
+        for offset in offsets
+    ]
+
+
+def make_nested_payload(count, seed=0):
+    """A dict payload with the dates nested in lists, exercising the second detection branch."""
+    return {
+        "facility": "94",
+        "available": make_days_payload(count, seed=seed),
+        "other": list(range(count)),
+    }
+
+
+def make_performance_log(count, json_ratio=0.3, header_count=12, seed=0):
+    """Chrome performance log entries: a mix of JSON responses and other network events."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        if rng.random() < json_ratio:
+            facility = rng.choice(list(main.facility_id_mapping))
+            message = {
+                "method": "Network.responseReceived",
+                "params": {
+                    "requestId": f"{1000 + i}.{i}",
+                    "response": {
+                        "url": f"{main.base_url}/en-ca/niv/schedule/12345678/appointment/days/{facility}.json?appointments[expedite]=false",
+                        "mimeType": "application/json",
+                        "headers": {f"x-header-{h}": "v" * 40 for h in range(header_count)},
+                    },
+                },
+            }
+        else:
+            message = {
+                "method": "Network.requestWillBeSent",
+                "params": {"requestId": f"{1000 + i}.{i}", "request": {"url": f"{main.base_url}/assets/{i}.js"}},
+            }
+        entries.append({"message": json.dumps({"message": message, "webview": "ABC"}), "level": "INFO"})
+    return entries
+
+
+def make_options_html(count):
+    """The facility <select> from the schedule page with `count` options."""
+    options = ['<option value=""></option>'] + [
+        f'<option value="{89 + i}">Facility {i}</option>' for i in range(count)
+    ]
+    return f'<select id="appointments_consulate_appointment_facility_id">{"".join(options)}</select>'
+
+
+def run_case(func, setup=None, number=None, repeat=5, min_time=0.2):
+    """
+    Time func() and return per-call statistics in microseconds.
+    setup() runs before every repeat, outside the timed region.
+    number is calibrated so each repeat takes at least min_time seconds.
+    """
+    if number is None:
+        number = 1
+        while True:
+            if setup:
+                setup()
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - started >= min_time or number >= 1 << 20:
+                break
+            number *= 2
+
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number * 1e6)
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min_us": round(min(timings), 3),
+        "median_us": round(statistics.median(timings), 3),
+        "max_us": round(max(timings), 3),
+    }
+
+
+def build_cases():
+    """Return {case name: (func, setup)} for every benchmarked hot path."""
+    cases = {}
+    source_url = f"{main.base_url}/en-ca/niv/schedule/12345678/appointment/days/94.json?appointments[expedite]=false"
+    main.target_end_date = datetime.now() + timedelta(days=10000)
+
+    # Detection: every date already notified (the steady state), and all dates new
+    for size_name, size in (("realistic", 60), ("extreme", 5000)):
+        payload = make_days_payload(size)
+        known = {f"{item['date']}_{main.facility_id_mapping['94']}" for item in payload}
+
+        def seed_known(known=known):
+            main.notified_dates = set(known)
+
+        cases[f"check_for_dates_in_range[list,{size_name},known]"] = (
+            lambda payload=payload: main.check_for_dates_in_range(payload, source_url, "94"),
+            seed_known,
+        )
+        cases[f"check_for_dates_in_range[nested,{size_name},known]"] = (
+            lambda payload=make_nested_payload(size): main.check_for_dates_in_range(payload, source_url, "94"),
+            seed_known,
+        )
+
+    new_payload = make_days_payload(60)
+
+    def forget_dates():
+        main.notified_dates = set()
+
+    def detect_new():
+        main.check_for_dates_in_range(new_payload, source_url, "94")
+        main.notified_dates.clear()
+
+    cases["check_for_dates_in_range[list,realistic,new]"] = (detect_new, forget_dates)
+
+    # Capture: parsing and queueing performance log entries
+    for size_name, size, headers in (("realistic", 200, 12), ("extreme", 5000, 200)):
+        entries = make_performance_log(size, header_count=headers)
+
+        def reset_queue():
+            main.json_queue = Queue()
+            main.processed_request_ids = set()
+
+        def process_all(entries=entries):
+            for entry in entries:
+                main.process_network_log(entry, "unused")
+            main.json_queue = Queue()
+
+        cases[f"process_network_log[{size_name},{size}]"] = (process_all, reset_queue)
+
+    for size_name, size in (("realistic", 7), ("extreme", 2000)):
+        html = make_options_html(size)
+        cases[f"parse_options[{size_name},{size}]"] = (lambda html=html: main.parse_options(html), None)
+
+    short_url = f"{main.base_url}/en-ca/niv/schedule/12345678/appointment"
+    long_url = f"{main.base_url}/en-ca/niv/" + "x/" * 2000 + "schedule/12345678/appointment"
+    no_match_url = f"{main.base_url}/en-ca/niv/" + "y/" * 2000
+    cases["extract_code_with_regex[short]"] = (lambda: main.extract_code_with_regex(short_url), None)
+    cases["extract_code_with_regex[long]"] = (lambda: main.extract_code_with_regex(long_url), None)
+    cases["extract_code_with_regex[no_match]"] = (lambda: main.extract_code_with_regex(no_match_url), None)
+
+    # State persistence with thousands of entries
+    for size in (1000, 20000):
+        slots = {f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}_{i}" for i in range(size)}
+
+        def seed_slots(slots=slots):
+            main.notified_dates = set(slots)
+
+        cases[f"save_reported_slots[{size}]"] = (main.save_reported_slots, seed_slots)
+
+        subscribers = {str(6_000_000_000 + i) for i in range(size)}
+
+        def seed_subscribers(subscribers=subscribers):
+            main.telegram_subscribers = set(subscribers)
+
+        cases[f"save_telegram_subscribers[{size}]"] = (main.save_telegram_subscribers, seed_subscribers)
+
+    return cases
+
+
+def compare(results, baseline, threshold):
+    """Return the cases whose median grew by more than `threshold` relative to the baseline."""
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        ratio = result["median_us"] / previous["median_us"] if previous["median_us"] else float("inf")
+        if ratio > 1 + threshold:
+            regressions[name] = {
+                "baseline_median_us": previous["median_us"],
+                "median_us": result["median_us"],
+                "ratio": round(ratio, 3),
+            }
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=None, help="where to write the JSON report (default: stdout only)")
+    parser.add_argument("--baseline", default=None, help="previous report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a case counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    # Paths are relative to where the script was started, not the scratch directory
+    output = args.output and os.path.join(INVOCATION_DIR, args.output)
+    baseline_path = args.baseline and os.path.join(INVOCATION_DIR, args.baseline)
+
+    results = {}
+    for name, (func, setup) in build_cases().items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = run_case(func, setup, repeat=args.repeat)
+        print(f"{name:60s} {results[name]['median_us']:>14.3f} us")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["threshold"] = args.threshold
+        report["regressions"] = compare(results, baseline, args.threshold)
+        for name, regression in report["regressions"].items():
+            print(f"REGRESSION {name}: {regression['baseline_median_us']} us -> {regression['median_us']} us (x{regression['ratio']})")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    main.log_listener.stop()
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,235 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue
+
+from selenium.webdriver.remote.webelement import WebElement
+
+
+class BrowserSession:
+    """
+    One isolated session inside a shared Chrome: its own browser context
+    (cookies, storage, cache) and a tab in it. Network log entries produced
+    by the tab are routed to `captures`.
+    """
+
+    def __init__(self, name, context_id, target_id):
+        self.name = name
+        self.context_id = context_id
+        self.target_id = target_id
+        self.created_at = time.time()
+        self.captures = Queue()
+        self.inflight = set()  # Request IDs sent but not yet finished or failed
+        self.last_network_activity = self.created_at
+
+    def note_network_event(self, event):
+        """Keep track of in-flight requests from a Network.* event the tab produced."""
+        method = event.get("method", "")
+        if not method.startswith("Network."):
+            return
+        request_id = event.get("params", {}).get("requestId")
+        if method == "Network.requestWillBeSent":
+            self.inflight.add(request_id)
+        elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+            self.inflight.discard(request_id)
+        self.last_network_activity = time.time()
+
+    def network_idle(self, quiet=0.5):
+        """True if no request is in flight and the network has been quiet for `quiet` seconds."""
+        return not self.inflight and time.time() - self.last_network_activity >= quiet
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+
+class SessionDriver:
+    """
+    Stands in for the WebDriver (or one of its elements) while driving one session.
+    Each command takes the host lock, switches to the session's tab, runs, and
+    switches back to the active session's tab before the lock is released, so
+    sessions driven from different threads take turns command by command.
+    """
+
+    def __init__(self, host, name, target):
+        self._host = host
+        self._name = name
+        self._target = target
+
+    def _run(self, command):
+        with self._host.lock:
+            session = self._host.sessions.get(self._name)
+            if session is None:
+                raise ValueError(f"Session {self._name} doesn't exist")
+            self._host._switch(session)
+            try:
+                return self._wrap(command())
+            finally:
+                self._host._restore()
+
+    def _wrap(self, value):
+        # Elements belong to the session's tab, so their commands must switch to it too
+        if isinstance(value, WebElement):
+            return SessionDriver(self._host, self._name, value)
+        if isinstance(value, list) and value and all(isinstance(item, WebElement) for item in value):
+            return [SessionDriver(self._host, self._name, item) for item in value]
+        return value
+
+    def __getattr__(self, attr):
+        # Properties such as current_url are commands too
+        value = self._run(lambda: getattr(self._target, attr))
+        if not callable(value) or isinstance(value, SessionDriver):
+            return value
+        return lambda *args, **kwargs: self._run(lambda: value(*args, **kwargs))
+
+
+class BrowserHost:
+    """
+    Runs several isolated sessions in a single Chrome instance.
+
+    Each session is a separate CDP browser context with one tab, so sessions
+    don't share cookies but do share the Chrome process tree. WebDriver
+    commands go to the current tab. The driver itself stays on the active
+    session's tab (see activate()), which is how the bot drives its primary
+    session; other sessions are driven through use(name), which switches tabs
+    for each command. Performance log entries carry the ID of the tab that produced them,
+    and route_logs() uses it to hand each entry to the right session and to
+    track each session's in-flight requests for network_idle().
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.sessions = {}
+        self.lock = threading.RLock()
+        self.current = None
+        self.active = None  # Session the bare driver is left on between commands
+        # Chrome's initial tab; the driver is parked there while a session is replaced
+        self.home_handle = driver.current_window_handle
+
+    def create_session(self, name, url="about:blank"):
+        """
+        Create an isolated session (browser context plus tab) and return it.
+        The driver is left on the tab it was on.
+        """
+        with self.lock:
+            if name in self.sessions:
+                raise ValueError(f"Session {name} already exists")
+            context = self.driver.execute_cdp_cmd("Target.createBrowserContext", {"disposeOnDetach": False})
+            target = self.driver.execute_cdp_cmd("Target.createTarget", {
+                "url": url,
+                "browserContextId": context["browserContextId"]
+            })
+            session = BrowserSession(name, context["browserContextId"], target["targetId"])
+            self.sessions[name] = session
+
+            # ChromeDriver uses the target ID as the window handle; network capture
+            # has to be enabled from the new tab
+            previous = self.sessions.get(self.current)
+            self._switch(session)
+            try:
+                self.driver.execute_cdp_cmd("Network.enable", {})
+            finally:
+                if previous is not None:
+                    self._switch(previous)
+                else:
+                    self.driver.switch_to.window(self.home_handle)
+                    self.current = None
+            return session
+
+    def _switch(self, session):
+        if self.current != session.name:
+            self.driver.switch_to.window(session.target_id)
+            self.current = session.name
+
+    def _restore(self):
+        if self.active is not None and self.active in self.sessions:
+            self._switch(self.sessions[self.active])
+
+    def activate(self, name):
+        """Leave the bare driver on a session's tab, so plain driver commands go to it."""
+        with self.lock:
+            if name not in self.sessions:
+                raise ValueError(f"Session {name} doesn't exist")
+            self.active = name
+            self._switch(self.sessions[name])
+
+    @contextmanager
+    def use(self, name):
+        """
+        Drive a session for the duration of the block through a stand-in for the
+        driver. The host lock is only held while each command runs, so a long login
+        in one session doesn't block the others (or route_logs).
+        """
+        if name not in self.sessions:
+            raise ValueError(f"Session {name} doesn't exist")
+        yield SessionDriver(self, name, self.driver)
+
+    def route_logs(self):
+        """
+        Drain the driver's performance log and put each entry on the queue of the
+        session whose tab produced it. Entries from unknown tabs are dropped.
+        Returns the number of entries routed.
+        """
+        with self.lock:
+            logs = self.driver.get_log("performance")
+            by_target = {session.target_id: session for session in self.sessions.values()}
+        routed = 0
+        for entry in logs:
+            try:
+                message = json.loads(entry["message"])
+            except (ValueError, KeyError):
+                continue
+            session = by_target.get(message.get("webview"))
+            if session is not None:
+                session.note_network_event(message.get("message", {}))
+                session.captures.put(entry)
+                routed += 1
+        return routed
+
+    def network_idle(self, name, quiet=0.5):
+        """
+        Route any pending log entries, then report whether a session's tab has
+        no request in flight and has seen no network activity for `quiet` seconds.
+        """
+        self.route_logs()
+        session = self.sessions.get(name)
+        return session is not None and session.network_idle(quiet)
+
+    def recycle_session(self, name, url="about:blank"):
+        """
+        Replace a session with a fresh context and tab, without touching the others.
+        An active session stays active. Returns the new session.
+        """
+        with self.lock:
+            was_active = self.active == name
+            self.close_session(name)
+            session = self.create_session(name, url)
+            if was_active:
+                self.activate(name)
+            return session
+
+    def close_session(self, name):
+        """Close a session's tab and dispose of its context (and with it, its cookies)."""
+        with self.lock:
+            session = self.sessions.pop(name, None)
+            if session is None:
+                return
+            if self.active == name:
+                self.active = None
+            if self.current == name:
+                # Don't leave the driver pointing at a tab that's about to close
+                self.driver.switch_to.window(self.home_handle)
+                self.current = None
+            try:
+                self.driver.execute_cdp_cmd("Target.closeTarget", {"targetId": session.target_id})
+            finally:
+                self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": session.context_id})
+
+    def close(self):
+        with self.lock:
+            for name in list(self.sessions):
+                try:
+                    self.close_session(name)
+                except Exception:
+                    pass
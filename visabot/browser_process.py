@@ -0,0 +1,171 @@
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import threading
+import time
+
+# Frame kinds
+FRAME_CAPTURE = 1   # browser -> detector: a captured response (metadata + raw body)
+FRAME_LOG = 2       # browser -> detector: a log record
+FRAME_STATE = 3     # browser -> detector: session state, doubling as the heartbeat
+FRAME_SETTINGS = 4  # detector -> browser: live settings the browser side needs
+FRAME_STOP = 5      # detector -> browser: shut down
+
+FRAME_HEADER = struct.Struct("<BII")  # kind, metadata length, payload length
+
+
+class FrameChannel:
+    """
+    Length-prefixed frames over a multiprocessing Connection.
+
+    A frame is one message holding a header (kind, metadata length, payload
+    length) and the JSON metadata. A payload, if any, follows as a second
+    message of raw bytes. It is never copied into the header buffer,
+    pickled or re-encoded, and the receiver gets the same bytes back.
+    Sends are serialized by a lock so several threads can share a channel;
+    each side has a single reader.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def send(self, kind, meta=None, payload=b""):
+        meta_bytes = json.dumps(meta or {}, default=str).encode("utf-8")
+        with self.lock:
+            self.conn.send_bytes(FRAME_HEADER.pack(kind, len(meta_bytes), len(payload)) + meta_bytes)
+            if payload:
+                self.conn.send_bytes(payload)
+
+    def recv(self):
+        """Receive one frame as (kind, meta, payload). Raises EOFError once the other side is gone."""
+        message = self.conn.recv_bytes()
+        kind, meta_length, payload_length = FRAME_HEADER.unpack_from(message)
+        meta = json.loads(message[FRAME_HEADER.size:FRAME_HEADER.size + meta_length])
+        payload = self.conn.recv_bytes() if payload_length else b""
+        return kind, meta, payload
+
+    def poll(self):
+        return self.conn.poll()
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    def close(self):
+        self.conn.close()
+
+
+class ChannelLogHandler(logging.Handler):
+    """
+    Forward log records to the other process as FRAME_LOG frames, so only one
+    process writes the log files. Records must already be prepared by a
+    QueueHandler (message formatted, traceback in exc_text).
+    """
+
+    FIELDS = ("name", "levelno", "levelname", "msg", "created", "threadName", "exc_text", "stage", "cycle_id", "fields")
+
+    def __init__(self, channel):
+        super().__init__()
+        self.channel = channel
+
+    def emit(self, record):
+        meta = {key: getattr(record, key, None) for key in self.FIELDS}
+        meta["threadName"] = f"{record.processName}/{record.threadName}"
+        try:
+            self.channel.send(FRAME_LOG, meta)
+        except (OSError, ValueError):
+            pass  # The other process is gone; nobody is left to read the record
+
+
+def record_from_frame(meta):
+    """Rebuild a log record sent by ChannelLogHandler."""
+    return logging.makeLogRecord(meta)
+
+
+def run_in_own_process_group(target, *args):
+    """
+    Entry point of the controller process: lead a new process group, which the
+    chromedriver and Chrome it starts inherit, then run the target.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    target(*args)
+
+
+class BrowserProcess:
+    """
+    Handle on the browser controller process.
+
+    The controller is started with the spawn method, so it gets a fresh
+    interpreter with no threads or locks inherited from this process. It is
+    called as target(conn, *args, *start_args), where conn is its end of a
+    duplex pipe. Captures, logs and state come back over that pipe as frames,
+    and settings and stop requests go out. stop() asks the controller to
+    shut down (closing Chrome) and kills it if it doesn't exit in time, so
+    restarting the browser never touches this process's state. The controller
+    leads its own process group, so killing it also kills the chromedriver and
+    Chrome processes under it instead of leaving them orphaned.
+    """
+
+    def __init__(self, target, args=()):
+        self.target = target
+        self.args = args
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.channel = None
+        self.started_at = 0
+        self.last_seen = 0
+
+    def start(self, *start_args):
+        """Start the controller and return the channel to it."""
+        parent_conn, child_conn = self.context.Pipe(duplex=True)
+        self.process = self.context.Process(
+            target=run_in_own_process_group,
+            args=(self.target, child_conn, *self.args, *start_args),
+            name="browser-controller",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.channel = FrameChannel(parent_conn)
+        self.started_at = self.last_seen = time.time()
+        return self.channel
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    @property
+    def exitcode(self):
+        return self.process.exitcode if self.process is not None else None
+
+    def stop(self, timeout=30):
+        """
+        Ask the controller to shut down, then kill it if it is still running after
+        `timeout` seconds. Whatever is left of its process group (a Chrome that
+        a crashed or killed controller never closed) is killed as well.
+        """
+        if self.process is None:
+            return
+        try:
+            self.channel.send(FRAME_STOP)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self._kill_group()
+            self.process.kill()
+            self.process.join(5)
+        self._kill_group()
+        self.channel.close()
+        self.process = None
+
+    def _kill_group(self):
+        if not hasattr(os, "killpg"):
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass  # The group has already exited
@@ -0,0 +1,187 @@
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+
+class LeaseStore:
+    """
+    Shared store the monitor instances coordinate through.
+
+    Every operation must be atomic across processes. SqliteLeaseStore works
+    for instances sharing a filesystem; another backend (Redis, etcd...) only
+    needs to implement these methods.
+    """
+
+    def touch_member(self, instance_id, ttl):
+        """Record that an instance is alive for the next `ttl` seconds."""
+        raise NotImplementedError
+
+    def live_members(self):
+        """Return the IDs of instances whose membership has not expired."""
+        raise NotImplementedError
+
+    def remove_member(self, instance_id):
+        raise NotImplementedError
+
+    def acquire_lease(self, name, holder, ttl):
+        """
+        Take or renew the named lease for `holder` if it is free, expired or
+        already held by `holder`. Returns True if `holder` now holds it.
+        """
+        raise NotImplementedError
+
+    def release_lease(self, name, holder):
+        raise NotImplementedError
+
+    def claim(self, key, holder):
+        """Claim a key once. Returns True only for the first holder to claim it."""
+        raise NotImplementedError
+
+    def prune_claims(self, older_than):
+        raise NotImplementedError
+
+
+class SqliteLeaseStore(LeaseStore):
+    """LeaseStore backed by a SQLite database file shared by all instances."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS members (instance_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, holder TEXT NOT NULL, claimed_at REAL NOT NULL)"
+            )
+
+    def touch_member(self, instance_id, ttl):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO members (instance_id, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(instance_id) DO UPDATE SET expires_at = excluded.expires_at",
+                (instance_id, time.time() + ttl)
+            )
+
+    def live_members(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT instance_id FROM members WHERE expires_at >= ? ORDER BY instance_id", (time.time(),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_member(self, instance_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM members WHERE instance_id = ?", (instance_id,))
+
+    def acquire_lease(self, name, holder, ttl):
+        now = time.time()
+        with self.lock:
+            # A single conditional upsert, so two instances can never both win
+            cursor = self.conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, holder, now + ttl, now)
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, name, holder):
+        with self.lock:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def claim(self, key, holder):
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO claims (key, holder, claimed_at) VALUES (?, ?, ?)",
+                (key, holder, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def prune_claims(self, older_than):
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM claims WHERE claimed_at < ?", (time.time() - older_than,))
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring: each member owns the keys that hash just before its virtual nodes."""
+
+    def __init__(self, members, replicas=64):
+        self.points = sorted(
+            (ring_hash(f"{member}#{replica}"), member)
+            for member in members
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in self.points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.hashes, ring_hash(key)) % len(self.points)
+        return self.points[index][1]
+
+
+class Coordinator:
+    """
+    Coordinates several monitor instances through a LeaseStore.
+
+    - membership: each instance refreshes its entry every sync();
+    - leadership: one instance holds the named lease and delivers alerts;
+    - dedupe: claim_alert() lets exactly one instance alert about a slot;
+    - load split: facilities are assigned to live instances by consistent
+      hashing, so adding or losing an instance only moves a few facilities.
+    """
+
+    LEADER_LEASE = "alert_delivery"
+
+    def __init__(self, store, instance_id=None, lease_ttl=15):
+        self.store = store
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.is_leader = False
+        self.members = [self.instance_id]
+
+    def sync(self):
+        """
+        Refresh membership and the leader lease. Call at least every lease_ttl / 3 seconds.
+        Returns True if leadership changed.
+        """
+        self.store.touch_member(self.instance_id, self.lease_ttl)
+        self.members = self.store.live_members() or [self.instance_id]
+        was_leader = self.is_leader
+        self.is_leader = self.store.acquire_lease(self.LEADER_LEASE, self.instance_id, self.lease_ttl)
+        return was_leader != self.is_leader
+
+    def claim_alert(self, slot_id):
+        """Atomically claim the alert for a slot. Only the first instance gets True."""
+        return self.store.claim(f"alert:{slot_id}", self.instance_id)
+
+    def owned_facilities(self, facility_ids):
+        """Return the facilities from facility_ids that this instance should poll."""
+        ring = HashRing(self.members)
+        return [facility_id for facility_id in facility_ids if ring.owner(str(facility_id)) == self.instance_id]
+
+    def leave(self):
+        """Give up leadership and membership so other instances take over immediately."""
+        if self.is_leader:
+            self.store.release_lease(self.LEADER_LEASE, self.instance_id)
+            self.is_leader = False
+        self.store.remove_member(self.instance_id)
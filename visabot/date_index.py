@@ -0,0 +1,115 @@
+import bisect
+import threading
+
+
+class DateIndex:
+    """
+    Sorted set of the dates currently available at one facility.
+
+    Dates are 'YYYY-MM-DD' strings, which sort in calendar order, kept in a
+    sorted list. Lookups and range queries bisect in O(log n). Inserts and
+    removals also bisect; shifting the list costs one memmove, which is
+    negligible for the few hundred dates a facility ever offers.
+    """
+
+    def __init__(self, dates=()):
+        self.dates = sorted(set(dates))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date_str):
+        index = bisect.bisect_left(self.dates, date_str)
+        return index < len(self.dates) and self.dates[index] == date_str
+
+    def add(self, date_str):
+        """Add a date. Returns True if it wasn't already present."""
+        index = bisect.bisect_left(self.dates, date_str)
+        if index < len(self.dates) and self.dates[index] == date_str:
+            return False
+        self.dates.insert(index, date_str)
+        return True
+
+    def discard(self, date_str):
+        """Remove a date if present. Returns True if it was removed."""
+        index = bisect.bisect_left(self.dates, date_str)
+        if index < len(self.dates) and self.dates[index] == date_str:
+            del self.dates[index]
+            return True
+        return False
+
+    def discard_before(self, date_str):
+        """Remove every date earlier than date_str (e.g. dates that have passed). Returns how many."""
+        index = bisect.bisect_left(self.dates, date_str)
+        del self.dates[:index]
+        return index
+
+    def earliest(self, start=None):
+        """The first date on or after start (or the first date overall), or None."""
+        index = 0 if start is None else bisect.bisect_left(self.dates, start)
+        return self.dates[index] if index < len(self.dates) else None
+
+    def range(self, start=None, end=None):
+        """The dates between start and end inclusive, in order."""
+        low = 0 if start is None else bisect.bisect_left(self.dates, start)
+        high = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return self.dates[low:high]
+
+    def replace(self, dates):
+        """
+        Make the index hold exactly `dates`, as reported by the latest observation.
+        Returns (added, removed) as sorted lists.
+        """
+        new_dates = sorted(set(dates))
+        current = set(self.dates)
+        latest = set(new_dates)
+        added = [d for d in new_dates if d not in current]
+        removed = [d for d in self.dates if d not in latest]
+        self.dates = new_dates
+        return added, removed
+
+
+class AvailabilityIndex:
+    """
+    Per-facility DateIndex of the dates currently available, with each
+    facility's earliest date, so detection can tell an improvement (an earlier
+    date than was available before) from a date that is merely new.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.facilities = {}
+
+    def observe(self, facility_id, dates, today=None):
+        """
+        Replace a facility's available dates with the latest observation, dropping
+        any before today. Returns (previous_earliest, earliest); either may be None.
+        """
+        with self.lock:
+            index = self.facilities.setdefault(facility_id, DateIndex())
+            if today is not None:
+                index.discard_before(today)
+            previous = index.earliest()
+            index.replace(d for d in dates if today is None or d >= today)
+            return previous, index.earliest()
+
+    def earliest(self, facility_id):
+        """The earliest date currently available at a facility, or None."""
+        with self.lock:
+            index = self.facilities.get(facility_id)
+            return index.earliest() if index is not None else None
+
+    def available(self, facility_id, start=None, end=None):
+        """The dates currently available at a facility between start and end inclusive."""
+        with self.lock:
+            index = self.facilities.get(facility_id)
+            return index.range(start, end) if index is not None else []
+
+    def best(self):
+        """Return {facility ID: earliest available date} for every facility with dates."""
+        with self.lock:
+            return {
+                facility_id: index.earliest()
+                for facility_id, index in self.facilities.items()
+                if len(index)
+            }
@@ -0,0 +1,353 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date, datetime
+
+# Slot dates are stored as days since 1970-01-01 in an unsigned 16-bit column
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+EVENT_RELEASED = 1
+EVENT_WITHDRAWN = 2
+
+
+def date_to_day(value):
+    """Convert a date or 'YYYY-MM-DD' string to the packed day number."""
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%Y-%m-%d").date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day):
+    """Convert a packed day number back to a date."""
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+
+class ColumnSegment:
+    """
+    Fixed-capacity, memory-mapped file holding one column array per field.
+
+    Layout: a 32-byte header (magic, row count, capacity, first and last
+    timestamp) followed by each column stored contiguously for `capacity`
+    rows. Columns are exposed as typed memoryviews, so reads and appends touch
+    the page cache directly without copying or decoding records.
+    """
+
+    MAGIC = b"VBHIST01"
+    HEADER = struct.Struct("<8sIIII8x")
+
+    def __init__(self, path, columns, capacity):
+        self.path = path
+        self.columns = columns
+        exists = os.path.exists(path)
+
+        if exists:
+            with open(path, "rb") as f:
+                magic, count, capacity, first_ts, last_ts = self.HEADER.unpack(f.read(self.HEADER.size))
+            if magic != self.MAGIC:
+                raise ValueError(f"Not a history segment: {path}")
+        self.capacity = capacity
+
+        size = self.HEADER.size + sum(struct.calcsize(code) for _, code in columns) * capacity
+        with open(path, "a+b") as f:
+            if not exists:
+                f.truncate(size)
+            self.mm = mmap.mmap(f.fileno(), size)
+
+        if not exists:
+            self.count, self.first_ts, self.last_ts = 0, 0, 0
+            self._write_header()
+        else:
+            self.count, self.first_ts, self.last_ts = count, first_ts, last_ts
+
+        # Lay out the widest columns first so every array stays aligned
+        self.arrays = {}
+        self.buffer = buffer = memoryview(self.mm)
+        offset = self.HEADER.size
+        for name, code in sorted(columns, key=lambda column: -struct.calcsize(column[1])):
+            width = struct.calcsize(code) * capacity
+            self.arrays[name] = buffer[offset:offset + width].cast(code)
+            offset += width
+
+    def _write_header(self):
+        self.HEADER.pack_into(self.mm, 0, self.MAGIC, self.count, self.capacity, self.first_ts, self.last_ts)
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, row_time, **values):
+        """
+        Append one row. `row_time` must be the row's value in the time column.
+        The header is only rewritten by sync(), so a batch of appends costs one header write.
+        """
+        index = self.count
+        for name, array in self.arrays.items():
+            array[index] = values[name]
+        if index == 0:
+            self.first_ts = row_time
+        self.last_ts = row_time
+        self.count = index + 1
+
+    def sync(self):
+        """Publish the appended rows by writing the row count to the header."""
+        self._write_header()
+
+    def column(self, name):
+        """Return the filled part of a column as a memoryview."""
+        return self.arrays[name][:self.count]
+
+    def flush(self):
+        self._write_header()
+        self.mm.flush()
+
+    def close(self):
+        self._write_header()
+        for array in self.arrays.values():
+            array.release()
+        self.arrays = {}
+        self.buffer.release()
+        self.mm.close()
+
+
+class SegmentedTable:
+    """
+    Append-only table split across numbered ColumnSegment files in a directory.
+    Rows are kept in non-decreasing timestamp order, which lets range queries
+    skip whole segments and binary-search inside the rest. A timestamp older
+    than the last stored one (the wall clock stepped back) is clamped to it.
+    """
+
+    def __init__(self, directory, prefix, columns, time_column, capacity):
+        self.directory = directory
+        self.prefix = prefix
+        self.columns = columns
+        self.time_column = time_column
+        self.capacity = capacity
+        os.makedirs(directory, exist_ok=True)
+
+        names = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(prefix + "_") and name.endswith(".seg")
+        )
+        self.segments = [ColumnSegment(os.path.join(directory, name), columns, capacity) for name in names]
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f"{self.prefix}_{len(self.segments):05d}.seg")
+        segment = ColumnSegment(path, self.columns, self.capacity)
+        self.segments.append(segment)
+        return segment
+
+    @property
+    def last_ts(self):
+        for segment in reversed(self.segments):
+            if segment.count:
+                return segment.last_ts
+        return 0
+
+    def __len__(self):
+        return sum(segment.count for segment in self.segments)
+
+    def append(self, **values):
+        ts = max(values[self.time_column], self.last_ts)
+        values[self.time_column] = ts
+        if self.segments and not self.segments[-1].full:
+            segment = self.segments[-1]
+        else:
+            if self.segments:
+                self.segments[-1].sync()
+            segment = self._open_segment()
+        segment.append(ts, **values)
+
+    def sync(self):
+        """Write the header of the segment currently being appended to."""
+        if self.segments:
+            self.segments[-1].sync()
+
+    def ranges(self, start=None, end=None):
+        """
+        Yield (segment, first_index, stop_index) for the rows with start <= ts < end.
+        """
+        for segment in self.segments:
+            if not segment.count:
+                continue
+            if end is not None and segment.first_ts >= end:
+                break
+            if start is not None and segment.last_ts < start:
+                continue
+            times = segment.column(self.time_column)
+            first = 0 if start is None else bisect.bisect_left(times, start)
+            stop = segment.count if end is None else bisect.bisect_left(times, end)
+            if first < stop:
+                yield segment, first, stop
+
+    def flush(self):
+        for segment in self.segments:
+            segment.flush()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+
+class AvailabilityHistory:
+    """
+    Compact time-series store of slot availability observations.
+
+    Every capture of a facility's days endpoint is recorded as one row per
+    available date (facility ID, observed timestamp, slot date: 8 bytes per
+    row, so a million observations take 8 MB). Alongside, a much smaller event
+    table records when each slot date appeared (released) and disappeared
+    (withdrawn) per facility; release-time and slot-lifetime queries run
+    over the event table only, so they stay in the millisecond range however
+    large the observation history grows.
+    """
+
+    OBSERVATION_COLUMNS = [("observed", "I"), ("facility", "H"), ("slot_day", "H")]
+    EVENT_COLUMNS = [("ts", "I"), ("facility", "H"), ("slot_day", "H"), ("kind", "B")]
+
+    def __init__(self, directory, segment_capacity=1 << 20):
+        self.lock = threading.Lock()
+        self.observations = SegmentedTable(
+            directory, "obs", self.OBSERVATION_COLUMNS, "observed", segment_capacity
+        )
+        self.events = SegmentedTable(
+            directory, "events", self.EVENT_COLUMNS, "ts", max(segment_capacity // 16, 1024)
+        )
+        # Rebuild the currently available set per facility from the event log
+        self.available = {}
+        for segment, first, stop in self.events.ranges():
+            facilities = segment.column("facility")
+            days = segment.column("slot_day")
+            kinds = segment.column("kind")
+            for i in range(first, stop):
+                current = self.available.setdefault(facilities[i], set())
+                if kinds[i] == EVENT_RELEASED:
+                    current.add(days[i])
+                else:
+                    current.discard(days[i])
+
+    def record(self, facility_id, dates, observed_at=None):
+        """
+        Record one observation of a facility's available dates.
+        `dates` is an iterable of date objects or 'YYYY-MM-DD' strings; an empty
+        observation withdraws every previously available date.
+        Returns (released, withdrawn) as sorted lists of day numbers.
+        """
+        facility = int(facility_id)
+        observed = int(time.time() if observed_at is None else observed_at)
+        days = {date_to_day(value) for value in dates}
+
+        with self.lock:
+            for day in sorted(days):
+                self.observations.append(observed=observed, facility=facility, slot_day=day)
+
+            previous = self.available.get(facility, set())
+            released = sorted(days - previous)
+            withdrawn = sorted(previous - days)
+            for day in released:
+                self.events.append(ts=observed, facility=facility, slot_day=day, kind=EVENT_RELEASED)
+            for day in withdrawn:
+                self.events.append(ts=observed, facility=facility, slot_day=day, kind=EVENT_WITHDRAWN)
+            self.available[facility] = days
+            self.observations.sync()
+            self.events.sync()
+
+        return released, withdrawn
+
+    def current_dates(self, facility_id):
+        """Return the dates currently available at a facility, sorted."""
+        with self.lock:
+            return [day_to_date(day) for day in sorted(self.available.get(int(facility_id), ()))]
+
+    def count_observations(self, facility_id=None, start=None, end=None):
+        """Count observations in [start, end), optionally for one facility."""
+        facility = None if facility_id is None else int(facility_id)
+        total = 0
+        with self.lock:
+            for segment, first, stop in self.observations.ranges(start, end):
+                if facility is None:
+                    total += stop - first
+                else:
+                    total += segment.column("facility")[first:stop].tolist().count(facility)
+        return total
+
+    def iter_observations(self, facility_id=None, start=None, end=None):
+        """Yield (facility_id, observed_ts, slot_date) rows in [start, end)."""
+        facility = None if facility_id is None else int(facility_id)
+        with self.lock:
+            chunks = []
+            for segment, first, stop in self.observations.ranges(start, end):
+                chunks.append((
+                    segment.column("facility")[first:stop].tolist(),
+                    segment.column("observed")[first:stop].tolist(),
+                    segment.column("slot_day")[first:stop].tolist(),
+                ))
+        for facilities, observed, days in chunks:
+            for row_facility, row_observed, day in zip(facilities, observed, days):
+                if facility is None or row_facility == facility:
+                    yield str(row_facility), row_observed, day_to_date(day)
+
+    def _iter_events(self, facility, start, end):
+        for segment, first, stop in self.events.ranges(start, end):
+            yield from zip(
+                segment.column("ts")[first:stop].tolist(),
+                segment.column("facility")[first:stop].tolist(),
+                segment.column("slot_day")[first:stop].tolist(),
+                segment.column("kind")[first:stop].tolist(),
+            )
+
+    def release_histogram(self, facility_id=None, start=None, end=None, by="hour"):
+        """
+        Count slot releases by local hour of day (by="hour", 24 buckets) or by
+        weekday (by="weekday", 7 buckets, Monday first) within [start, end).
+        """
+        facility = None if facility_id is None else int(facility_id)
+        buckets = [0] * (24 if by == "hour" else 7)
+        with self.lock:
+            for ts, row_facility, _, kind in self._iter_events(facility, start, end):
+                if kind != EVENT_RELEASED or (facility is not None and row_facility != facility):
+                    continue
+                local = time.localtime(ts)
+                buckets[local.tm_hour if by == "hour" else local.tm_wday] += 1
+        return buckets
+
+    def slot_lifetimes(self, facility_id=None, start=None, end=None):
+        """
+        Return how long each released slot date stayed available, as a list of
+        (facility_id, slot_date, released_ts, withdrawn_ts, seconds) for slots
+        released within [start, end). Slots still available have withdrawn_ts None
+        and are measured up to now.
+        """
+        facility = None if facility_id is None else int(facility_id)
+        open_slots = {}
+        lifetimes = []
+        now = int(time.time())
+        with self.lock:
+            for ts, row_facility, day, kind in self._iter_events(facility, start, None):
+                if facility is not None and row_facility != facility:
+                    continue
+                key = (row_facility, day)
+                if kind == EVENT_RELEASED:
+                    if end is None or ts < end:
+                        open_slots[key] = ts
+                elif key in open_slots:
+                    released = open_slots.pop(key)
+                    lifetimes.append((str(row_facility), day_to_date(day), released, ts, ts - released))
+        for (row_facility, day), released in open_slots.items():
+            lifetimes.append((str(row_facility), day_to_date(day), released, None, now - released))
+        lifetimes.sort(key=lambda row: row[2])
+        return lifetimes
+
+    def flush(self):
+        with self.lock:
+            self.observations.flush()
+            self.events.flush()
+
+    def close(self):
+        with self.lock:
+            self.observations.close()
+            self.events.close()
@@ -1,27 +1,41 @@
 import re
+import asyncio
 import logging
 import time
+import math
 import os
 import json
 import urllib.parse
 import threading
+import multiprocessing
 import requests
+import aiohttp
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from datetime import datetime
 from queue import Queue
 from bs4 import BeautifulSoup
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import WebDriverException
 import logging.handlers
+import itertools
+import copy
+from queue import Full
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+from outbox import Outbox
+from history import AvailabilityHistory
+from sinks import TelegramSink, WebhookSink
+from coordination import Coordinator, SqliteLeaseStore
+from browser_host import BrowserHost
+from date_index import AvailabilityIndex
+from runtime import TaskSupervisor
+from browser_process import (
+    BrowserProcess, ChannelLogHandler, FrameChannel, record_from_frame,
+    FRAME_CAPTURE, FRAME_LOG, FRAME_STATE, FRAME_SETTINGS, FRAME_STOP
+)
 
 if not os.getenv("REPL_ID"):
     load_dotenv()
@@ -29,18 +43,137 @@ if not os.getenv("REPL_ID"):
 # Create logs directory
 os.makedirs("logs", exist_ok=True)
 
-# Set up rotating file handler
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as one JSON object per line so the log file can be searched.
+    Structured fields passed through log_event (stage, cycle ID, facility, timings...)
+    are included as top-level keys.
+    """
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key in ("stage", "cycle_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through only one in every `sample_rate` records of a high-volume event.
+    Records without a sample_rate are never dropped. An event is identified by its
+    stage plus its sample_key, or the call site that logged it; never by the
+    message text, which usually has values formatted into it.
+    """
+    max_keys = 1000
+
+    def __init__(self):
+        super().__init__()
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        sample_rate = getattr(record, "sample_rate", None)
+        if not sample_rate or sample_rate <= 1:
+            return True
+        key = (getattr(record, "stage", None), getattr(record, "sample_key", None) or (record.pathname, record.lineno))
+        with self.lock:
+            counter = self.counters.get(key)
+            if counter is None:
+                if len(self.counters) >= self.max_keys:
+                    # Only a runaway set of sample keys gets here; start counting afresh
+                    self.counters.clear()
+                counter = self.counters[key] = itertools.count()
+            return next(counter) % sample_rate == 0
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the caller: if the writer falls behind and the
+    queue is full, the record is dropped and counted instead.
+    """
+    dropped = 0
+
+    def prepare(self, record):
+        # Keep the traceback separate from the message so it becomes its own JSON field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            DroppingQueueHandler.dropped += 1
+
+# Set up rotating file handler (structured JSON) and console output.
+# Both are written by a background listener thread; callers only enqueue records.
 log_file = os.path.join("logs", "scraper.log")
 handler = logging.handlers.RotatingFileHandler(
     log_file, maxBytes=10*1024*1024, backupCount=5, encoding="utf-8"
 )
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
+handler.setFormatter(JsonFormatter())
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter('%(message)s'))
+
+log_queue = Queue(maxsize=10000)
+queue_handler = DroppingQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter())
+log_listener = logging.handlers.QueueListener(
+    log_queue, handler, console_handler, respect_handler_level=True
+)
+log_listener.start()
+
+# Configure loggers - third-party libraries only report warnings,
+# the bot's own logger records operational detail
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger().addHandler(queue_handler)
+logger = logging.getLogger("visabot")
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+# Identifier of the current monitoring cycle, attached to every structured log record
+current_cycle_id = None
+
+def log_event(stage, message, level=logging.INFO, sample_rate=None, sample_key=None, exc_info=False, **fields):
+    """
+    Log a structured event without blocking on I/O.
+    stage names the pipeline step (capture, detect, alert, login...), extra keyword
+    arguments such as facility or duration_ms become JSON fields, and sample_rate
+    keeps only one in N records of a high-volume event. Records are sampled per
+    call site, or per sample_key when one call site logs several kinds of event.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    # stacklevel=2 attributes the record to log_event's caller
+    logger.log(level, message, exc_info=exc_info, stacklevel=2, extra={
+        "stage": stage,
+        "cycle_id": current_cycle_id,
+        "sample_rate": sample_rate,
+        "sample_key": sample_key,
+        "fields": fields,
+    })
 
-# Configure logger - Set to ERROR level to suppress info messages
-logger = logging.getLogger()
-logger.setLevel(logging.ERROR)
-logger.addHandler(handler)
+# Login over plain HTTP first ("auto"), only in the browser ("browser"), or never fall back ("http")
+login_mode = os.getenv("LOGIN_MODE", "auto").lower()
+http_user_agent = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+bot_challenge_markers = ("cf-chl", "challenge-platform", "captcha", "just a moment...", "attention required")
 
 # Base URLs
 base_url = "https://ais.usvisa-info.com"
@@ -48,20 +181,89 @@ url = "https://ais.usvisa-info.com/en-ca/niv/users/sign_in"
 url_after_login = "https://ais.usvisa-info.com/en-ca/niv/groups/"
 
 # Global variables for real-time processing
-json_queue = Queue()
+json_queue = asyncio.Queue()  # Filled and drained on the event loop; each run of the loop creates a fresh one
 processed_request_ids = set()
-should_stop = False
 login_active = False
 driver = None
+browser_host = None  # Isolated browser contexts sharing the single Chrome instance
+primary_session = "primary"
 user_code = None
 last_activity_time = time.time()
 browser_restart_count = 0
 
+# Readiness signals the login and sweep flow waits on instead of fixed sleeps
+days_response_times = {}  # facility ID -> when its days XHR last arrived
+days_response_condition = threading.Condition()
+page_ready_timeout = 15
+days_response_timeout = 10
+network_idle_quiet = 0.5  # Seconds without network activity that count as idle
+
+# Clock used by detection, alerts and history; replay swaps it for a fake clock
+clock = time.time
+
+# Checkpoint of the running state (Telegram offset, session, schedule code,
+# facility snapshots, scheduler timers) so a restart can resume in seconds
+checkpoint_file = os.getenv("CHECKPOINT_FILE", os.path.join("date_alerts", "checkpoint.json"))
+checkpoint_interval = 15
+checkpoint_max_session_age = 20 * 60  # Older sessions are assumed expired and not restored
+scheduler_state = {"last_login_time": 0, "last_browser_restart_time": 0, "refresh_count": 0}
+facility_snapshots = {}  # facility ID -> {"observed_at": ..., "dates": [...]}
+
+# Asyncio runtime: every long-running loop is a supervised task on one event loop.
+# Blocking Selenium calls go to browser_executor (a few threads, so log routing and
+# body fetches can run while a login or sweep is in progress); other blocking work
+# (disk, SQLite, requests) goes to the loop's default executor.
+runtime_loop = None
+task_supervisor = None
+supervisor_check_interval = 2
+browser_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="browser")
+supervisor_task = None
+outbox_ready = None  # asyncio.Event set when an alert is enqueued
+telegram_http = None  # aiohttp session for the Telegram long poll
+telegram_last_update_id = 0
+
+# Process isolation: Chrome, login, sweeps and capture run in a separate browser
+# controller process that streams captured bodies to this (detector) process as
+# raw bytes over a pipe. The detector owns detection, history, alerts and the bot.
+# The controller is a spawned child, which is how it recognizes itself on import;
+# it must not open the stores the detector owns.
+in_browser_process = multiprocessing.parent_process() is not None
+browser_process = None  # BrowserProcess handle, in the detector
+capture_channel = None  # FrameChannel to the detector, in the controller
+capture_queue = None  # asyncio.Queue of (meta, body) received from the controller
+browser_cookies = None  # Latest session cookies reported by the controller
+browser_state_at = 0  # When the controller last reported its state
+browser_state_interval = 5
+browser_process_stall_timeout = 120  # Restart the controller after this long without a state report
+browser_process_max_inactivity = 3600  # ...or this long without capturing anything
+browser_process_healthy_run = 600
+browser_process_failures = 0
+browser_process_restart_at = None  # When a stopped controller is due to be started again
+
 # Date monitoring configuration
 date_alerts_dir = "date_alerts"
 os.makedirs(date_alerts_dir, exist_ok=True)
 target_end_date = datetime(2026, 1, 1)  # Target end date: January 1, 2026
 notified_dates = set()  # Keep track of dates we've already notified about
+availability_index = AvailabilityIndex()  # Per-facility dates currently available in range
+# "new" alerts on every date not notified before; "improvement" only when a facility's
+# earliest date gets earlier than what was available, or falls on or before alert_threshold_date
+alert_mode = "new"
+alert_threshold_date = None  # 'YYYY-MM-DD' or None
+
+# Live configuration: a JSON file watched for changes plus admin bot commands.
+# Scheduler settings are kept in one dict that is replaced as a whole, so the
+# monitoring loop always sees a consistent set of intervals.
+config_file = os.getenv("CONFIG_FILE", "config.json")
+config_lock = threading.Lock()
+config_file_mtime = None
+admin_chat_ids = {c.strip() for c in os.getenv("ADMIN_CHAT_IDS", "").split(",") if c.strip()}
+credential_config_keys = {"telegram_bot_token"}  # Never accepted from /set, so never written to the file by the bot
+scheduler_settings = {
+    "relogin_interval": 300,
+    "browser_restart_interval": 86400,
+    "loop_interval": 10
+}
 
 # Telegram configuration
 telegram_enabled = True
@@ -71,6 +273,25 @@ telegram_bot_token = os.getenv('Token')
 telegram_subscribers_file = os.path.join(date_alerts_dir, "telegram_subscribers.json")
 telegram_subscribers = set()
 
+# Cross-instance coordination (optional): set COORDINATION_DB to a database shared by every instance
+coordination_db = os.getenv("COORDINATION_DB")
+coordinator = (
+    Coordinator(SqliteLeaseStore(coordination_db), os.getenv("INSTANCE_ID") or None)
+    if coordination_db and not in_browser_process else None
+)
+
+# Durable outbox of alert messages; detection enqueues, the delivery worker sends.
+# When several instances are coordinated, OUTBOX_DB must point at a shared path: only the leader drains it.
+# Claims carry the instance ID, so set INSTANCE_ID for a restarted instance to resume its own claims at once.
+alert_outbox = None if in_browser_process else Outbox(
+    os.getenv("OUTBOX_DB") or os.path.join(date_alerts_dir, "outbox.db"),
+    owner=coordinator.instance_id if coordinator is not None else None
+)
+assigned_facilities = None  # Facilities this instance polls; None means all of them
+
+# Compact history of every days-endpoint observation, for release-time and slot-lifetime queries
+availability_history = None if in_browser_process else AvailabilityHistory(os.path.join(date_alerts_dir, "history"))
+
 # Load existing subscribers if file exists
 if os.path.exists(telegram_subscribers_file):
     try:
@@ -78,7 +299,7 @@ if os.path.exists(telegram_subscribers_file):
             subscribers = json.load(f)
             telegram_subscribers = set(subscribers)
     except Exception as e:
-        print(f"Error loading Telegram subscribers: {e}")
+        log_event("telegram", f"Error loading Telegram subscribers: {e}", logging.ERROR)
 
 # Save the subscribers list to file
 def save_telegram_subscribers():
@@ -88,9 +309,21 @@ def save_telegram_subscribers():
     try:
         with open(telegram_subscribers_file, "w") as f:
             json.dump(list(telegram_subscribers), f)
-        print(f"Saved {len(telegram_subscribers)} Telegram subscribers to file")
+        log_event("telegram", f"Saved {len(telegram_subscribers)} Telegram subscribers to file", subscribers=len(telegram_subscribers))
     except Exception as e:
-        print(f"Error saving Telegram subscribers: {e}")
+        log_event("telegram", f"Error saving Telegram subscribers: {e}", logging.ERROR)
+
+# Available-times enrichment: when an alert is delivered, its dates are looked up on the times endpoint
+# concurrently and cached per (facility, date) for a short time
+enrich_times = os.getenv("ENRICH_TIMES", "true").lower() == "true"
+times_cache_ttl = int(os.getenv("TIMES_CACHE_TTL", "60"))
+times_max_dates = int(os.getenv("TIMES_MAX_DATES", "10"))
+times_request_timeout = 10
+times_enrich_timeout = 5  # Most an alert's delivery waits for its times
+times_cache = {}
+times_cache_lock = threading.Lock()
+times_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="times")
+http_session = requests.Session()
 
 # Facility ID to location name mapping
 facility_id_mapping = {
@@ -117,36 +350,11 @@ if os.path.exists(reported_slots_file):
             # Convert the list to a set for faster lookups
             notified_dates = set(reported_slots)
     except Exception as e:
-        print(f"Error loading reported slots: {e}")
+        log_event("state", f"Error loading reported slots: {e}", logging.ERROR)
         reported_slots = []
 else:
     reported_slots = []
 
-def send_telegram_alert(message):
-    """
-    Send an alert message via Telegram bot API.
-    Returns True if successful, False otherwise.
-    """
-    global telegram_enabled, telegram_bot_token, telegram_subscribers
-    
-    if not telegram_enabled or not telegram_bot_token:
-        return False
-    
-    try:
-        url = f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage"
-        for chat_id in telegram_subscribers:
-            data = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "Markdown"
-            }
-            response = requests.post(url, data=data)
-            response.raise_for_status()
-        return True
-    except Exception as e:
-        print(f"Error sending Telegram alert: {e}")
-        return False
-
 # Function to save reported slots to prevent duplicates after restart
 def save_reported_slots():
     """
@@ -156,7 +364,7 @@ def save_reported_slots():
         with open(reported_slots_file, "w") as f:
             json.dump(list(notified_dates), f)
     except Exception as e:
-        print(f"Error saving reported slots: {e}")
+        log_event("state", f"Error saving reported slots: {e}", logging.ERROR)
 
 def parse_options(html):
     soup = BeautifulSoup(html, "html.parser")
@@ -187,13 +395,14 @@ def setup_driver():
     options.add_argument("--headless")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-gpu")
-    options.set_capability("goog:loggingPrefs", {"browser": "ALL"})  # Remove "performance"
+    # Performance logs carry the network events the capture pipeline is built on
+    options.set_capability("goog:loggingPrefs", {"browser": "ALL", "performance": "ALL"})
 
     try:
         driver = uc.Chrome(options=options)
-        print("undetected-chromedriver initialized successfully")
+        log_event("browser", "undetected-chromedriver initialized successfully")
     except Exception as e:
-        print(f"undetected-chromedriver initialization failed: {e}")
+        log_event("browser", f"undetected-chromedriver initialization failed: {e}", logging.ERROR)
         raise
     
     # Set page load timeout
@@ -201,6 +410,25 @@ def setup_driver():
     
     return driver
 
+def current_datetime():
+    """Return the current local time according to the pipeline clock."""
+    return datetime.fromtimestamp(clock())
+
+def start_browser():
+    """
+    Start Chrome and open the bot's session in its own browser context.
+    Further sessions (other accounts or shards) can be added to browser_host
+    without starting another Chrome.
+    """
+    global driver, browser_host
+    
+    driver = setup_driver()
+    browser_host = BrowserHost(driver)
+    # The bot drives its session with the bare driver, so leave the driver on its tab
+    browser_host.create_session(primary_session)
+    browser_host.activate(primary_session)
+    return driver
+
 def create_output_directory():
     """Create and return a directory for saving JSON files."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -208,12 +436,53 @@ def create_output_directory():
     os.makedirs(output_dir, exist_ok=True)
     return output_dir
 
+def resolve_location(facility_id, source_url):
+    """
+    Work out which facility a payload belongs to, from the facility ID if given,
+    else from the source URL. Returns (facility ID or None, location name).
+    """
+    if facility_id and facility_id in facility_id_mapping:
+        return facility_id, facility_id_mapping[facility_id]
+    
+    try:
+        facility_id_match = re.search(r'facility_id=([0-9]+)', source_url)
+        if facility_id_match:
+            extracted_id = facility_id_match.group(1)
+            if extracted_id in facility_id_mapping:
+                return extracted_id, facility_id_mapping[extracted_id]
+        # If we still don't have a location, try to extract from the filename in the URL
+        elif "/" in source_url:
+            filename = source_url.split("/")[-1].split(".")[0]
+            if filename in facility_id_mapping:
+                return filename, facility_id_mapping[filename]
+    except Exception as e:
+        log_event("detect", f"Error extracting location from URL: {e}", logging.ERROR, source_url=source_url)
+    return facility_id, "Unknown Location"
+
+def is_improvement(date_str, previous_earliest, earliest, threshold=None):
+    """
+    Whether a new date is worth an alert in improvement mode: it is on or before
+    the threshold, or it is the facility's earliest date and earlier than the
+    earliest date that was available before this observation.
+    """
+    if threshold and date_str <= threshold:
+        return True
+    return date_str == earliest and (previous_earliest is None or date_str < previous_earliest)
+
+def is_days_payload(json_data, source_url):
+    """Whether a payload is a facility's list of available dates from the days endpoint."""
+    return "/appointment/days/" in source_url and isinstance(json_data, list)
+
 def check_for_dates_in_range(json_data, source_url, facility_id=None):
     """
     Check if the JSON contains dates within the target range.
     Returns a list of found dates that are in range.
     """
-    today = datetime.now().date()
+    started = time.perf_counter()
+    today = current_datetime().date()
+    # Read the live settings once so a config change can't apply halfway through a payload
+    end_date = target_end_date.date()
+    mode, threshold = alert_mode, alert_threshold_date
     found_dates = []
     
     try:
@@ -228,7 +497,7 @@ def check_for_dates_in_range(json_data, source_url, facility_id=None):
                         date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
                         
                         # Check if date is between today and target end date
-                        if today <= date_obj <= target_end_date.date():
+                        if today <= date_obj <= end_date:
                             found_dates.append((date_str, item.get('business_day', True)))
                     except (ValueError, TypeError):
                         pass
@@ -241,7 +510,7 @@ def check_for_dates_in_range(json_data, source_url, facility_id=None):
                     date_str = json_data['date']
                     date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
                     
-                    if today <= date_obj <= target_end_date.date():
+                    if today <= date_obj <= end_date:
                         found_dates.append((date_str, json_data.get('business_day', True)))
                 except (ValueError, TypeError):
                     pass
@@ -255,60 +524,60 @@ def check_for_dates_in_range(json_data, source_url, facility_id=None):
                                 date_str = item['date']
                                 date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
                                 
-                                if today <= date_obj <= target_end_date.date():
+                                if today <= date_obj <= end_date:
                                     found_dates.append((date_str, item.get('business_day', True)))
                             except (ValueError, TypeError):
                                 pass
         
+        # Track what the facility offers now, so improvement alerts can compare against it.
+        # Only a days listing says what the facility offers; an error body must not empty it.
+        resolved_facility, location_info = resolve_location(facility_id, source_url)
+        previous_earliest, earliest = None, None
+        if resolved_facility and is_days_payload(json_data, source_url):
+            previous_earliest, earliest = availability_index.observe(
+                resolved_facility, [date_str for date_str, _ in found_dates], today.isoformat()
+            )
+        
         # Print found dates or indicate no dates are available
         if found_dates:
-            # Extract location information from URL if available
-            location_info = "Unknown Location"
-            
-            # First try to use the provided facility_id
-            if facility_id and facility_id in facility_id_mapping:
-                location_info = facility_id_mapping[facility_id]
-            else:
-                # Try to extract from URL if not provided
-                try:
-                    facility_id_match = re.search(r'facility_id=([0-9]+)', source_url)
-                    if facility_id_match:
-                        extracted_id = facility_id_match.group(1)
-                        if extracted_id in facility_id_mapping:
-                            location_info = facility_id_mapping[extracted_id]
-                    # If we still don't have a location, try to extract from the filename in the URL
-                    elif "/" in source_url:
-                        filename = source_url.split("/")[-1].split(".")[0]
-                        if filename in facility_id_mapping:
-                            location_info = facility_id_mapping[filename]
-                        elif filename.isdigit() and filename in facility_id_mapping:
-                            location_info = facility_id_mapping[filename]
-                except Exception as e:
-                    print(f"Error extracting location from URL: {e}")
-            
             # Generate a unique identifier for each date to prevent duplicates
             # Format: date_location
             date_identifiers = [f"{date_str}_{location_info}" for date_str, _ in found_dates]
             
             # Filter out dates we've already notified about
             new_date_indices = [i for i, date_id in enumerate(date_identifiers) if date_id not in notified_dates]
+            
+            # In improvement mode, a new date only alerts if it is the facility's new earliest
+            # date or falls on or before the threshold; the rest stay un-notified
+            if mode == "improvement":
+                new_date_indices = [
+                    i for i in new_date_indices
+                    if is_improvement(found_dates[i][0], previous_earliest, earliest, threshold)
+                ]
+            
+            # With several instances running, only the one that claims a slot alerts about it
+            if coordinator is not None and new_date_indices:
+                claimed = [i for i in new_date_indices if coordinator.claim_alert(date_identifiers[i])]
+                notified_dates.update(date_identifiers[i] for i in new_date_indices if i not in claimed)
+                new_date_indices = claimed
             new_dates = [found_dates[i] for i in new_date_indices]
             new_date_ids = [date_identifiers[i] for i in new_date_indices]
             
             if new_dates:
-                print("\n=====================================================")
-                print(f"FOUND {len(new_dates)} NEW AVAILABLE DATE(S) at {location_info}:")
-                
-                for date_str, is_business_day in new_dates:
-                    print(f"  - {date_str} (Business day: {is_business_day})")
-                
-                print("=====================================================")
+                log_event(
+                    "detect",
+                    f"FOUND {len(new_dates)} NEW AVAILABLE DATE(S) at {location_info}: "
+                    + ", ".join(f"{date_str} (Business day: {is_business_day})" for date_str, is_business_day in new_dates),
+                    facility=facility_id,
+                    location=location_info,
+                    dates=[date_str for date_str, _ in new_dates]
+                )
                 
                 # Add new dates to notified set
                 notified_dates.update(new_date_ids)
                 
                 # Save alert to file with timestamp
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                timestamp = current_datetime().strftime("%Y%m%d_%H%M%S")
                 alert_file = os.path.join(date_alerts_dir, f"date_alert_{timestamp}.json")
                 
                 with open(alert_file, "w", encoding="utf-8") as f:
@@ -319,100 +588,296 @@ def check_for_dates_in_range(json_data, source_url, facility_id=None):
                         "found_dates": [{"date": date, "business_day": is_business} for date, is_business in new_dates]
                     }, f, indent=2)
                 
-                # Send Telegram alert if configured
-                if telegram_enabled:
-                    # Group dates by location
-                    dates_by_location = {}
-                    for i, (date_str, _) in enumerate(new_dates):
-                        try:
-                            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                            formatted_date = date_obj.strftime('%d/%m/%Y')
-                        except:
-                            formatted_date = date_str
-                        
-                        if location_info not in dates_by_location:
-                            dates_by_location[location_info] = []
-                        dates_by_location[location_info].append(formatted_date)
-                    
-                    # Send a single message for each location with all its dates
-                    for loc, dates in dates_by_location.items():
-                        if len(dates) == 1:
-                            # Single date format
-                            message = f"🔴Update🔴\nAppointment Alert\nSLOT AVAILABLE FOR :\nCity : {loc}\nDate : ({dates[0]})"
-                        else:
-                            # Multiple dates format
-                            message = f"🔴Update🔴\nAppointment Alert\nMULTIPLE SLOTS AVAILABLE FOR :\nCity : {loc}\nDates : \n"
-                            for date in dates:
-                                message += f"- ({date})\n"
-                        
-                        send_telegram_alert(message)
+                # Queue the alert for every configured notification sink right away; the
+                # available times are looked up in the delivery stage (enrich_alert_payload)
+                if any(sink.enabled for sink in notification_sinks.values()):
+                    alert = {
+                        "facility_id": resolved_facility,
+                        "location": location_info,
+                        "dates": [date_str for date_str, _ in new_dates],
+                        "times": None,
+                        "mode": mode,
+                        "earliest": earliest,
+                        "previous_earliest": previous_earliest,
+                        "source_url": source_url,
+                        "detected_at": current_datetime().isoformat(timespec="seconds")
+                    }
+                    enqueue_alert(format_alert_message(alert), alert)
                 
                 # Save reported slots to prevent duplicates after restart
                 save_reported_slots()
         
+        log_event(
+            "detect",
+            f"Checked {source_url}: {len(found_dates)} date(s) in range",
+            sample_rate=20,
+            facility=facility_id,
+            dates_in_range=len(found_dates),
+            duration_ms=round((time.perf_counter() - started) * 1000, 3)
+        )
         return found_dates
         
     except Exception as e:
-        print(f"Error checking for dates: {e}")
+        log_event("detect", f"Error checking for dates: {e}", logging.ERROR, exc_info=True, facility=facility_id)
         return []
 
-def json_consumer_worker(output_dir):
+def format_alert_message(alert):
+    """Build the text of an alert about new dates at one location, with their times where known."""
+    times_by_date = alert.get("times") or {}
+    dates = []
+    for date_str in alert["dates"]:
+        try:
+            formatted_date = datetime.strptime(date_str, '%Y-%m-%d').strftime('%d/%m/%Y')
+        except ValueError:
+            formatted_date = date_str
+        dates.append((formatted_date, times_by_date.get(date_str)))
+    
+    loc = alert["location"]
+    if len(dates) == 1:
+        # Single date format
+        date, times = dates[0]
+        message = f"🔴Update🔴\nAppointment Alert\nSLOT AVAILABLE FOR :\nCity : {loc}\nDate : ({date})"
+        if times:
+            message += f"\nTimes : {', '.join(times)}"
+    else:
+        # Multiple dates format
+        message = f"🔴Update🔴\nAppointment Alert\nMULTIPLE SLOTS AVAILABLE FOR :\nCity : {loc}\nDates : \n"
+        for date, times in dates:
+            message += f"- ({date})" + (f" {', '.join(times)}" if times else "") + "\n"
+    if alert.get("mode") == "improvement" and alert.get("previous_earliest"):
+        message += f"\nEarlier than the previous earliest date ({alert['previous_earliest']})"
+    return message
+
+def enrich_alert_payload(payload):
+    """
+    Add the available times to a queued alert and rebuild its text, spending at
+    most times_enrich_timeout seconds on the lookup. Called in the delivery stage,
+    so a slow times endpoint only delays this alert, never detection.
+    Returns the enriched payload (payloads that aren't new-date alerts, or were
+    already enriched, are returned unchanged).
+    """
+    if "dates" not in payload or payload.get("times") is not None:
+        return payload
+    times_by_date = get_available_times(payload.get("facility_id"), payload["dates"], timeout=times_enrich_timeout)
+    enriched = dict(payload, times=times_by_date)
+    enriched["text"] = format_alert_message(enriched)
+    return enriched
+
+def record_availability(json_data, source_url, facility_id):
+    """
+    Record a facility's full list of available dates (in range or not) in the
+    availability history. Only days-endpoint payloads for a known facility are recorded.
+    """
+    if not facility_id or not is_days_payload(json_data, source_url):
+        return
+    
+    try:
+        dates = [item["date"] for item in json_data if isinstance(item, dict) and "date" in item]
+        observed_at = clock()
+        facility_snapshots[facility_id] = {"observed_at": observed_at, "dates": dates}
+        released, withdrawn = availability_history.record(facility_id, dates, observed_at=observed_at)
+        if released or withdrawn:
+            log_event(
+                "history",
+                f"Availability changed at {facility_id_mapping.get(facility_id, facility_id)}: "
+                f"{len(released)} released, {len(withdrawn)} withdrawn",
+                facility=facility_id,
+                available=len(dates)
+            )
+    except Exception as e:
+        log_event("history", f"Error recording availability: {e}", logging.ERROR, facility=facility_id)
+
+def sync_http_session_cookies():
+    """
+    Copy the browser's session cookies (as last reported by the browser process)
+    into the shared HTTP session so direct requests to the site are authenticated
+    like the browser.
+    """
+    cookies = driver.get_cookies() if driver is not None else browser_cookies or []
+    for cookie in cookies:
+        http_session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+
+def fetch_available_times(facility_id, date_str):
+    """
+    Fetch the available appointment times for one facility and date from the times endpoint.
+    Returns the list of times (e.g. ["08:00", "08:15"]); raises on failure.
+    """
+    times_url = f"{base_url}/en-ca/niv/schedule/{user_code}/appointment/times/{facility_id}.json"
+    response = http_session.get(
+        times_url,
+        params={"date": date_str, "appointments[expedite]": "false"},
+        headers={
+            "Accept": "application/json",
+            "X-Requested-With": "XMLHttpRequest",
+            "Referer": f"{base_url}/en-ca/niv/schedule/{user_code}/appointment"
+        },
+        timeout=times_request_timeout
+    )
+    response.raise_for_status()
+    return response.json().get("available_times") or []
+
+def get_available_times(facility_id, dates, timeout=None):
     """
-    Worker thread that consumes the JSON queue and saves them to files.
-    Will keep running until should_stop is set to True and the queue is empty.
-    Always overwrites existing JSON files with the same base name.
+    Return {date: [times]} for the given dates at a facility.
+    Cached results younger than times_cache_ttl are reused; the rest are fetched
+    concurrently, waiting at most `timeout` seconds in total. Dates whose lookup
+    failed or didn't finish in time are left out, so the alert still goes out
+    without times.
     """
-    global should_stop, processed_request_ids, driver, last_activity_time
+    if not enrich_times or not facility_id or not user_code or not dates:
+        return {}
     
-    while not should_stop:
+    started = time.perf_counter()
+    now = time.time()
+    result = {}
+    missing = []
+    with times_cache_lock:
+        for date_str in dates:
+            cached = times_cache.get((facility_id, date_str))
+            if cached and cached[0] > now:
+                result[date_str] = cached[1]
+            else:
+                missing.append(date_str)
+    
+    # Only the earliest dates are worth enriching when a large batch appears at once
+    missing = missing[:times_max_dates]
+    if missing:
         try:
-            # Get item from queue with a timeout to allow checking should_stop
+            sync_http_session_cookies()
+        except Exception as e:
+            log_event("enrich", f"Error copying browser cookies: {e}", logging.WARNING)
+        
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = {date_str: times_executor.submit(fetch_available_times, facility_id, date_str) for date_str in missing}
+        for date_str, future in futures.items():
             try:
-                request_id, filename_base, source_url, facility_id = json_queue.get(timeout=1)
-                last_activity_time = time.time()  # Update activity timestamp
-            except:
-                # If queue is empty, just continue the loop
+                times = future.result(None if deadline is None else max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                log_event("enrich", f"Gave up waiting for times for {date_str}", logging.WARNING, facility=facility_id)
                 continue
-                
+            except Exception as e:
+                log_event("enrich", f"Error fetching times for {date_str}: {e}", logging.WARNING, facility=facility_id)
+                continue
+            result[date_str] = times
+            with times_cache_lock:
+                times_cache[(facility_id, date_str)] = (time.time() + times_cache_ttl, times)
+    
+    with times_cache_lock:
+        # Drop expired entries so the cache stays small
+        for key in [key for key, (expires_at, _) in times_cache.items() if expires_at <= now]:
+            del times_cache[key]
+    
+    log_event(
+        "enrich",
+        f"Looked up times for {len(dates)} date(s), fetched {len(missing)}",
+        facility=facility_id,
+        fetched=len(missing),
+        cached=len(dates) - len(missing),
+        duration_ms=round((time.perf_counter() - started) * 1000, 3)
+    )
+    return result
+
+def process_captured_body(body, filename_base, source_url, facility_id, output_dir):
+    """
+    Run a captured response body through detection and the availability history,
+    then save it to the output directory (always overwriting the same base name).
+    body is the raw bytes from the browser process (or a str). Shared by the
+    live detector and offline replay.
+    """
+    file_path = os.path.join(output_dir, f"{filename_base}.json")
+    
+    # Try to pretty print if it's valid JSON
+    try:
+        json_content = json.loads(body)
+        
+        # Check for dates in the target range
+        check_for_dates_in_range(json_content, source_url, facility_id)
+        record_availability(json_content, source_url, facility_id)
+        
+        # Save the JSON file
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(json_content, f, indent=2)
+            
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # If not valid JSON, save as-is
+        if isinstance(body, bytes):
+            with open(file_path, "wb") as f:
+                f.write(body)
+        else:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(body)
+
+async def run_in_browser(func, *args):
+    """Run a blocking Selenium call in the browser executor so it never blocks the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(browser_executor, func, *args)
+
+async def json_consumer_worker():
+    """
+    Task (in the browser process) that consumes the JSON queue: fetches each
+    response body over CDP and streams it to the detector process as raw bytes.
+    Runs until cancelled.
+    """
+    global last_activity_time
+    
+    while True:
+        heartbeat("json_consumer")
+        try:
+            request_id, filename_base, source_url, facility_id = await asyncio.wait_for(json_queue.get(), timeout=5)
+        except asyncio.TimeoutError:
+            continue
+        last_activity_time = time.time()  # Update activity timestamp
+        
+        try:
             # Skip if already processed
             if request_id in processed_request_ids:
-                json_queue.task_done()
                 continue
-                
-            # Create filepath (always overwrite)
-            file_path = os.path.join(output_dir, f"{filename_base}.json")
-                
-            try:
-                # Fetch the response body using CDP
-                response = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
-                body = response["body"]
-                
-                # Try to pretty print if it's valid JSON
-                try:
-                    json_content = json.loads(body)
-                    
-                    # Check for dates in the target range
-                    check_for_dates_in_range(json_content, source_url, facility_id)
-                    
-                    # Save the JSON file
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(json_content, f, indent=2)
-                        
-                except json.JSONDecodeError:
-                    # If not valid JSON, save as-is
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.write(body)
-                
-                processed_request_ids.add(request_id)
-                
-            except Exception as e:
-                print(f"Error saving response body: {e}")
-                
-            finally:
-                json_queue.task_done()
-                
-        except Exception as worker_error:
-            print(f"Error in JSON consumer worker: {worker_error}")
+            
+            # Fetch the response body using CDP
+            fetch_started = time.perf_counter()
+            response = await run_in_browser(driver.execute_cdp_cmd, "Network.getResponseBody", {"requestId": request_id})
+            body = response["body"].encode("utf-8")
+            log_event(
+                "capture",
+                f"Fetched response body for {filename_base}",
+                sample_rate=20,
+                facility=facility_id,
+                bytes=len(body),
+                duration_ms=round((time.perf_counter() - fetch_started) * 1000, 3)
+            )
+            
+            await asyncio.to_thread(capture_channel.send, FRAME_CAPTURE, {
+                "filename": filename_base,
+                "url": source_url,
+                "facility_id": facility_id
+            }, body)
+            processed_request_ids.add(request_id)
+            heartbeat("json_consumer", progressed=1)
+            
+        except Exception as e:
+            log_event("capture", f"Error forwarding response body: {e}", logging.ERROR, facility=facility_id, source_url=source_url)
+            
+        finally:
+            json_queue.task_done()
+
+async def detector_worker(output_dir):
+    """
+    Task (in the detector process) that runs the captures received from the
+    browser process through detection and saving, in arrival order.
+    Runs until cancelled.
+    """
+    while True:
+        heartbeat("detector")
+        try:
+            meta, body = await asyncio.wait_for(capture_queue.get(), timeout=5)
+        except asyncio.TimeoutError:
+            continue
+        
+        try:
+            # Detection writes files and may look up times, so it runs off the loop
+            await asyncio.to_thread(process_captured_body, body, meta["filename"], meta["url"], meta["facility_id"], output_dir)
+            heartbeat("detector", progressed=1)
+        except Exception as e:
+            log_event("detect", f"Error processing capture: {e}", logging.ERROR, facility=meta.get("facility_id"), source_url=meta.get("url"))
 
 def process_network_log(log, output_dir):
     """Process a single network log entry and queue it if it's JSON."""
@@ -451,59 +916,257 @@ def process_network_log(log, output_dir):
                 facility_id = facility_id_match.group(1)
             else:
                 # Try to extract facility ID from filename (e.g., "95.json" for Vancouver)
-                filename_id_match = re.match(r'^(\d+)$', filename)
+                filename_id_match = re.match(r'^(\d+)(?:\.json)?$', filename)
                 if filename_id_match and filename_id_match.group(1) in facility_id_mapping:
                     facility_id = filename_id_match.group(1)
             
             # Add to queue for processing
-            json_queue.put((request_id, filename, url, facility_id))
+            json_queue.put_nowait((request_id, filename, url, facility_id))
+            if facility_id and "/appointment/days/" in url:
+                note_days_response(facility_id)
             last_activity_time = time.time()  # Update activity timestamp
             
     except Exception as e:
-        print(f"Error processing log entry: {e}")
+        log_event("capture", f"Error processing log entry: {e}", logging.ERROR, sample_rate=10)
 
-def network_log_monitor(output_dir):
+async def network_log_monitor(output_dir):
     """
-    Monitor network logs in a separate thread.
-    Will keep running until should_stop is set to True.
+    Task that drains the browser's network log and queues JSON responses.
+    Chrome only hands out its performance log on request, so this polls it
+    every half second. Runs until cancelled.
     """
-    global should_stop, driver
-    
-    # Keep track of when we last processed logs
-    last_log_time = time.time()
-    
-    while not should_stop:
+    while True:
+        heartbeat("network_log_monitor")
         try:
-            # Get new logs
-            logs = driver.get_log("performance")
+            # Get new logs and route them to the session whose tab produced them
+            await run_in_browser(browser_host.route_logs)
+            session = browser_host.sessions.get(primary_session)
+            logs = []
+            while session is not None and not session.captures.empty():
+                logs.append(session.captures.get_nowait())
             
+            # Process each log entry
+            for log in logs:
+                process_network_log(log, output_dir)
             if logs:
-                last_log_time = time.time()
-                
-                # Process each log entry
-                for log in logs:
-                    process_network_log(log, output_dir)
-                    
+                heartbeat("network_log_monitor", progressed=len(logs))
+            
             # Sleep a bit to avoid hammering the CPU
-            time.sleep(0.5)
+            await asyncio.sleep(0.5)
             
         except Exception as e:
-            print(f"Error monitoring network logs: {e}")
-            time.sleep(1)  # Sleep a bit longer on error
+            log_event("capture", f"Error monitoring network logs: {e}", logging.ERROR)
+            await asyncio.sleep(1)  # Sleep a bit longer on error
+
+def log_wait(name, started, ready, sample_rate=None, **fields):
+    """Record how long a wait actually took and whether it ended on its signal or its timeout."""
+    elapsed = time.perf_counter() - started
+    log_event(
+        "wait",
+        f"{name} {'ready' if ready else 'timed out'} after {elapsed:.2f}s",
+        logging.INFO if ready else logging.WARNING,
+        sample_rate=sample_rate if ready else None,
+        sample_key=name,
+        wait=name,
+        timed_out=not ready,
+        duration_ms=round(elapsed * 1000),
+        **fields
+    )
+
+def wait_until(name, condition, timeout, poll_interval=0.1, sample_rate=None, **fields):
+    """
+    Poll condition() until it returns something truthy or timeout seconds pass.
+    WebDriver errors raised by the condition count as "not yet".
+    Returns the condition's last result (falsy on timeout) and logs the time spent.
+    """
+    started = time.perf_counter()
+    deadline = started + timeout
+    while True:
+        try:
+            result = condition()
+        except WebDriverException:
+            result = None
+        if result or time.perf_counter() >= deadline:
+            break
+        time.sleep(poll_interval)
+    log_wait(name, started, bool(result), sample_rate=sample_rate, **fields)
+    return result
+
+def note_days_response(facility_id):
+    """Signal that a facility's days XHR has arrived; wakes anything waiting for it."""
+    with days_response_condition:
+        days_response_times[facility_id] = time.time()
+        days_response_condition.notify_all()
+
+def wait_for_days_response(facility_id, since, timeout=None):
+    """
+    Block until the days XHR for a facility arrives after `since` (a time.time() value).
+    Returns True if it arrived, False on timeout.
+    """
+    started = time.perf_counter()
+    with days_response_condition:
+        arrived = days_response_condition.wait_for(
+            lambda: days_response_times.get(facility_id, 0) >= since,
+            timeout or days_response_timeout
+        )
+    log_wait("days_response", started, arrived, facility=facility_id)
+    return arrived
+
+def wait_for_schedule_page():
+    """
+    Wait until the schedule page's facility dropdown is present and the page's
+    network has gone idle. Returns True if the dropdown showed up.
+    """
+    dropdown = wait_until(
+        "schedule_dropdown",
+        lambda: driver.find_elements(By.ID, "appointments_consulate_appointment_facility_id"),
+        page_ready_timeout
+    )
+    wait_until(
+        "network_idle",
+        lambda: browser_host.network_idle(primary_session, network_idle_quiet),
+        page_ready_timeout
+    )
+    return bool(dropdown)
+
+class BotChallengeError(Exception):
+    """Raised when the site answers a plain HTTP request with a bot challenge instead of the page."""
+
+def looks_like_bot_challenge(response):
+    """Check whether a response is a bot-protection challenge rather than the real page."""
+    if response.status_code in (403, 429, 503):
+        return True
+    text = response.text[:20000].lower()
+    return any(marker in text for marker in bot_challenge_markers)
+
+def http_login(email, password):
+    """
+    Log in with plain HTTP requests: fetch the sign-in page, extract the
+    authenticity token, post the credentials and find the schedule link.
+    Returns (session, schedule_url) on success, or None if the credentials were rejected.
+    Raises BotChallengeError if the site serves a bot challenge, and ValueError if a
+    page doesn't look like expected (both mean the browser should be used instead).
+    """
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": http_user_agent,
+        "Accept-Language": "en-CA,en;q=0.9"
+    })
+    
+    # Sign-in page: authenticity token for the form
+    response = session.get(url, timeout=20)
+    if looks_like_bot_challenge(response):
+        raise BotChallengeError(f"sign-in page returned a challenge (HTTP {response.status_code})")
+    soup = BeautifulSoup(response.text, "html.parser")
+    token_meta = soup.find("meta", attrs={"name": "csrf-token"})
+    token_input = soup.find("input", attrs={"name": "authenticity_token"})
+    token = (token_meta and token_meta.get("content")) or (token_input and token_input.get("value"))
+    if not token:
+        raise ValueError("no authenticity token on the sign-in page")
+    
+    # Submit the credentials the way the page's remote form does
+    response = session.post(
+        url,
+        data={
+            "utf8": "✓",
+            "authenticity_token": token,
+            "user[email]": email,
+            "user[password]": password,
+            "policy_confirmed": "1",
+            "commit": "Sign In"
+        },
+        headers={
+            "X-CSRF-Token": token,
+            "X-Requested-With": "XMLHttpRequest",
+            "Accept": "*/*;q=0.5, text/javascript, application/javascript",
+            "Referer": url
+        },
+        timeout=20
+    )
+    if looks_like_bot_challenge(response):
+        raise BotChallengeError(f"sign-in returned a challenge (HTTP {response.status_code})")
+    if response.status_code == 401:
+        return None
     
-    print("Network log monitor stopped")
+    # Groups page: the schedule link
+    response = session.get(url_after_login, timeout=20)
+    if looks_like_bot_challenge(response):
+        raise BotChallengeError(f"groups page returned a challenge (HTTP {response.status_code})")
+    if "/users/sign_in" in response.url:
+        return None
+    soup = BeautifulSoup(response.text, "html.parser")
+    schedule = soup.select_one('a[href^="/en-ca/niv/schedule/"]')
+    if schedule is None:
+        raise ValueError("no schedule link on the groups page")
+    
+    schedule_url = urllib.parse.urljoin(base_url, schedule["href"].replace("_actions", ""))
+    return session, schedule_url
 
 def login(email, password):
     """
     Log in to the website.
+    Unless LOGIN_MODE is "browser", logs in over plain HTTP and hands the session
+    cookies to the browser; the browser's sign-in form is only used when the
+    site serves a bot challenge (or the pages look unexpected).
+    Returns True if login successful, False otherwise.
+    """
+    global driver, user_code, login_active, last_activity_time
+    
+    if login_mode == "browser":
+        return browser_login(email, password)
+    
+    login_started = time.perf_counter()
+    try:
+        log_event("login", "Logging in over HTTP...")
+        result = http_login(email, password)
+        if result is None:
+            log_event("login", "Login failed: credentials rejected", logging.ERROR)
+            login_active = False
+            return False
+        session, schedule_url = result
+        user_code = extract_code_with_regex(schedule_url)
+        log_event("login", "Login successful!", mode="http", duration_ms=round((time.perf_counter() - login_started) * 1000))
+        
+        # Share the session with the times lookups and the browser
+        http_session.cookies.update(session.cookies)
+        driver.get(base_url)
+        for cookie in session.cookies:
+            driver.add_cookie({"name": cookie.name, "value": cookie.value, "path": cookie.path or "/", "secure": bool(cookie.secure)})
+        
+        log_event("login", "Opening appointment schedule page...")
+        driver.get(schedule_url)
+        if "/users/sign_in" in driver.current_url:
+            raise ValueError("browser did not accept the HTTP session")
+        
+        sweep_facilities()
+        
+        login_active = True
+        last_activity_time = time.time()  # Update activity timestamp
+        return True
+    except (BotChallengeError, ValueError, requests.RequestException) as e:
+        if login_mode == "http":
+            log_event("login", f"Login failed: {e}", logging.ERROR)
+            login_active = False
+            return False
+        log_event("login", f"HTTP login unavailable ({e}), falling back to the browser", logging.WARNING)
+        return browser_login(email, password)
+    except Exception as e:
+        log_event("login", f"Login failed: {e}", logging.ERROR, duration_ms=round((time.perf_counter() - login_started) * 1000))
+        login_active = False
+        return False
+
+def browser_login(email, password):
+    """
+    Log in to the website by filling in the sign-in form in the browser.
     Returns True if login successful, False otherwise.
     """
     global driver, user_code, login_active, last_activity_time
     
+    login_started = time.perf_counter()
     try:
         # Navigate to login page
         driver.get(url)
-        print("Loading login page...")
+        log_event("login", "Loading login page...")
         
         # Find and fill login elements
         email_field = WebDriverWait(driver, 10).until(
@@ -514,7 +1177,7 @@ def login(email, password):
         # Fill in credentials
         email_field.send_keys(email)
         password_field.send_keys(password)
-        print("Entering credentials...")
+        log_event("login", "Entering credentials...")
         
         # Use JavaScript to check the checkbox (bypasses the click interception)
         checkbox = driver.find_element(By.CSS_SELECTOR, 'input[name="policy_confirmed"]')
@@ -523,51 +1186,154 @@ def login(email, password):
         # Submit using JavaScript too for good measure
         submit_button = driver.find_element(By.CSS_SELECTOR, 'input[type="submit"][name="commit"]')
         driver.execute_script("arguments[0].click();", submit_button)
-        print("Logging in...")
+        log_event("login", "Logging in...")
         
         # Wait for login to complete
         WebDriverWait(driver, 30).until(
             lambda d: url_after_login in d.current_url
         )
-        print("Login successful!")
+        log_event("login", "Login successful!", mode="browser", duration_ms=round((time.perf_counter() - login_started) * 1000))
         
         # Find the schedule link
-        print("Looking for appointment schedule...")
+        log_event("login", "Looking for appointment schedule...")
         schedule = WebDriverWait(driver, 15).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, 'a[href^="/en-ca/niv/schedule/"]'))
         )
         
         schedule_url = schedule.get_attribute("href").replace("_actions", "")
         user_code = extract_code_with_regex(schedule_url)
-        print(f"Found appointment schedule")
+        log_event("login", "Found appointment schedule")
         
         # Navigate to the schedule page
-        print(f"Opening appointment schedule page...")
+        log_event("login", "Opening appointment schedule page...")
         driver.get(schedule_url)
-        time.sleep(2)
         
-        # Locate the dropdown element
-        dropdown = Select(driver.find_element(By.ID, "appointments_consulate_appointment_facility_id"))
-
-        # Iterate through all options (excluding the first empty one)
-        for index in range(1, len(dropdown.options)):
-            selected_option = dropdown.options[index]
-            facility_id = selected_option.get_attribute("value")
-            if facility_id in skip_facilities:
-                continue
-            print(f"Checking location: {selected_option.text}")
-            dropdown.select_by_index(index)
-            time.sleep(3)  # Wait 3 seconds to observe the selection
+        sweep_facilities()
             
         login_active = True
         last_activity_time = time.time()  # Update activity timestamp
         return True
         
     except Exception as e:
-        print(f"Login failed: {e}")
+        log_event("login", f"Login failed: {e}", logging.ERROR, duration_ms=round((time.perf_counter() - login_started) * 1000))
         login_active = False
         return False
 
+def sweep_facilities():
+    """
+    Select every polled facility in the schedule page's dropdown, which makes the
+    page request each facility's available days (picked up by the network monitor).
+    Moves on to the next facility as soon as the previous one's days XHR arrives.
+    """
+    started = time.perf_counter()
+    if not wait_for_schedule_page():
+        raise ValueError("schedule page has no facility dropdown")
+    
+    # Locate the dropdown element
+    dropdown = Select(driver.find_element(By.ID, "appointments_consulate_appointment_facility_id"))
+
+    # Iterate through all options (excluding the first empty one)
+    for index in range(1, len(dropdown.options)):
+        selected_option = dropdown.options[index]
+        facility_id = selected_option.get_attribute("value")
+        if facility_id in skip_facilities or not facility_is_assigned(facility_id):
+            continue
+        log_event("login", f"Checking location: {selected_option.text}", facility=facility_id)
+        since = time.time()
+        dropdown.select_by_index(index)
+        wait_for_days_response(facility_id, since)
+    log_event("login", "Swept facilities", duration_ms=round((time.perf_counter() - started) * 1000))
+
+def save_checkpoint():
+    """
+    Save the state needed to resume quickly after a restart.
+    Written atomically so a crash mid-write never leaves a corrupt checkpoint.
+    """
+    checkpoint = {
+        "saved_at": time.time(),
+        "telegram_last_update_id": telegram_last_update_id,
+        "user_code": user_code,
+        "login_active": login_active,
+        "scheduler": dict(scheduler_state),
+        "facility_snapshots": dict(facility_snapshots)
+    }
+    if login_active and browser_cookies:
+        checkpoint["cookies"] = browser_cookies
+    
+    # The file holds live session cookies, so only the owner may read it
+    temp_file = f"{checkpoint_file}.tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)  # A leftover from a crash might have looser permissions
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_file, checkpoint_file)
+
+def load_checkpoint():
+    """Return the last saved checkpoint, or None if there is no usable one."""
+    if not os.path.exists(checkpoint_file):
+        return None
+    try:
+        with open(checkpoint_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError) as e:
+        log_event("checkpoint", f"Ignoring unreadable checkpoint: {e}", logging.WARNING)
+        return None
+
+def resume_session(checkpoint):
+    """
+    Try to reuse the session saved in a checkpoint instead of logging in again:
+    restore the cookies, open the schedule page and sweep the facilities.
+    Returns True if the saved session is still valid.
+    """
+    global user_code, login_active, last_activity_time
+    
+    cookies = checkpoint.get("cookies")
+    saved_code = checkpoint.get("user_code")
+    if not cookies or not saved_code or not checkpoint.get("login_active"):
+        return False
+    if time.time() - checkpoint.get("saved_at", 0) > checkpoint_max_session_age:
+        log_event("checkpoint", "Saved session is too old to resume")
+        return False
+    
+    started = time.perf_counter()
+    try:
+        # Cookies can only be set for the domain currently loaded
+        driver.get(base_url)
+        for cookie in cookies:
+            cookie.pop("sameSite", None)
+            driver.add_cookie(cookie)
+        
+        schedule_url = f"{base_url}/en-ca/niv/schedule/{saved_code}/appointment"
+        driver.get(schedule_url)
+        if "/users/sign_in" in driver.current_url:
+            log_event("checkpoint", "Saved session has expired")
+            return False
+        
+        user_code = saved_code
+        sweep_facilities()
+        login_active = True
+        last_activity_time = time.time()
+        log_event("checkpoint", "Resumed saved session", duration_ms=round((time.perf_counter() - started) * 1000))
+        return True
+    except Exception as e:
+        log_event("checkpoint", f"Could not resume saved session: {e}", logging.WARNING)
+        return False
+
+async def checkpoint_worker():
+    """
+    Task that saves a checkpoint every checkpoint_interval seconds, using the
+    session state last reported by the browser process. Runs until cancelled.
+    """
+    while True:
+        heartbeat("checkpoint")
+        try:
+            await asyncio.to_thread(save_checkpoint)
+            heartbeat("checkpoint", progressed=1)
+        except Exception as e:
+            log_event("checkpoint", f"Error saving checkpoint: {e}", logging.ERROR)
+        await asyncio.sleep(checkpoint_interval)
+
 def is_logged_in():
     """Check if we're still logged in."""
     global driver
@@ -577,46 +1343,49 @@ def is_logged_in():
         current_url = driver.current_url
         if url_after_login in current_url:
             return True
-            
-        # Try to find an element that would only exist if logged in
-        WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'a[href^="/en-ca/niv/schedule/"]'))
+        if "/users/sign_in" in current_url:
+            return False
+        
+        # Let the current page finish loading, then look once for an element that
+        # would only exist if logged in (no fixed wait for an element that isn't coming)
+        wait_until(
+            "page_loaded",
+            lambda: driver.execute_script("return document.readyState") == "complete",
+            5,
+            sample_rate=20
         )
-        return True
+        return bool(driver.find_elements(By.CSS_SELECTOR, 'a[href^="/en-ca/niv/schedule/"]'))
     except:
         return False
 
 def restart_browser(email, password, output_dir):
     """Restart the browser completely and re-initialize everything."""
-    global driver, should_stop, login_active, browser_restart_count
+    global driver, login_active, browser_restart_count
     
-    print("Restarting browser...")
+    log_event("browser", "Restarting browser...", restart_count=browser_restart_count + 1)
     browser_restart_count += 1
     
     try:
-        # Close existing browser if it exists
+        # Close existing browser if it exists, and wait for its driver process to exit
         if driver:
+            process = getattr(getattr(driver, "service", None), "process", None)
             driver.quit()
-            
-        # Small delay to ensure resources are released
-        time.sleep(5)
+            if process is not None:
+                wait_until("driver_exit", lambda: process.poll() is not None, 5)
         
-        # Initialize new browser
-        driver = setup_driver()
-        
-        # Enable network interception via CDP
-        driver.execute_cdp_cmd("Network.enable", {})
+        # Initialize new browser with network interception enabled
+        start_browser()
         
         # Login again
         login_result = login(email, password)
         if login_result:
-            print(f"Browser restart complete and login successful")
+            log_event("browser", "Browser restart complete and login successful")
         else:
-            print(f"Browser restart complete but login failed")
+            log_event("browser", "Browser restart complete but login failed", logging.WARNING)
         
         return login_result
     except Exception as e:
-        print(f"Error restarting browser: {e}")
+        log_event("browser", f"Error restarting browser: {e}", logging.ERROR)
         return False
 
 def health_check(max_inactivity_time=3600):
@@ -628,12 +1397,118 @@ def health_check(max_inactivity_time=3600):
     
     # If no activity for too long, system might be stuck
     if time_since_activity > max_inactivity_time:
-        print(f"No activity detected for {time_since_activity:.1f} seconds")
+        log_event("health", f"No activity detected for {time_since_activity:.1f} seconds", logging.WARNING)
         return False
         
     return True
 
-def update_date_monitoring_config():
+def heartbeat(name, progressed=0):
+    """
+    Record that a task is alive, optionally adding to its progress counter.
+    Called by tasks on every loop iteration and after every processed item.
+    """
+    if task_supervisor is not None:
+        task_supervisor.heartbeat(name, progressed)
+
+def get_worker_status():
+    """
+    Return a snapshot of every supervised task's liveness and progress.
+    """
+    return task_supervisor.status() if task_supervisor is not None else {}
+
+def check_workers():
+    """
+    Restart any supervised task that exited, crashed or stopped sending heartbeats.
+    Only the failed task is restarted; the browser and other tasks are left alone.
+    A task that keeps crashing is restarted with back-off.
+    Returns the list of failed task names.
+    """
+    failed = task_supervisor.check()
+    for name, reason, delay in failed:
+        outcome = f"restarting it in {delay:g} seconds" if delay else "restarted it"
+        log_event("supervisor", f"Task {name} failed ({reason}), {outcome}", logging.WARNING, worker=name, delay=delay)
+    return [name for name, _, _ in failed]
+
+def is_alert_leader():
+    """Whether this instance delivers alerts and answers the bot (always true when running alone)."""
+    return coordinator is None or coordinator.is_leader
+
+def facility_is_assigned(facility_id):
+    """Whether this instance should poll the facility (always true when running alone)."""
+    return assigned_facilities is None or facility_id in assigned_facilities
+
+def update_coordination(prune=False):
+    """
+    Refresh this instance's membership and leader lease and recompute which
+    facilities it polls. Blocking (it talks to the lease store).
+    """
+    global assigned_facilities
+    
+    if coordinator.sync():
+        role = "leader" if coordinator.is_leader else "follower"
+        log_event("coordination", f"Instance {coordinator.instance_id} is now {role}", role=role)
+    
+    polled = [f for f in facility_id_mapping if f not in skip_facilities]
+    owned = coordinator.owned_facilities(polled)
+    if owned != assigned_facilities:
+        assigned_facilities = owned
+        log_event(
+            "coordination",
+            f"Polling {len(owned)} of {len(polled)} facilities across {len(coordinator.members)} instance(s)",
+            facilities=owned,
+            members=coordinator.members
+        )
+    
+    if prune:
+        coordinator.store.prune_claims(30 * 86400)
+
+async def coordination_worker():
+    """
+    Task that keeps this instance's membership and leader lease fresh and
+    recomputes which facilities it polls whenever instances join or leave.
+    Runs until cancelled.
+    """
+    last_prune = 0
+    while True:
+        heartbeat("coordination")
+        try:
+            prune = time.time() - last_prune > 3600
+            await asyncio.to_thread(update_coordination, prune)
+            if prune:
+                last_prune = time.time()
+            heartbeat("coordination", progressed=1)
+        except Exception as e:
+            log_event("coordination", f"Error in coordination worker: {e}", logging.ERROR)
+        await asyncio.sleep(coordinator.lease_ttl / 3)
+
+async def supervisor_worker():
+    """
+    Task that watches the heartbeats of all supervised tasks and revives
+    dead or hung ones within a few seconds. Runs until cancelled.
+    """
+    log_event("supervisor", "Starting task supervisor...")
+    
+    try:
+        while True:
+            try:
+                check_workers()
+            except Exception as e:
+                log_event("supervisor", f"Error in task supervisor: {e}", logging.ERROR)
+            await asyncio.sleep(supervisor_check_interval)
+    finally:
+        log_event("supervisor", "Task supervisor stopped.")
+
+def ensure_supervisor():
+    """Start the task supervisor, or restart it if it died."""
+    global supervisor_task
+    
+    if supervisor_task is not None and not supervisor_task.done():
+        return
+    if supervisor_task is not None:
+        log_event("supervisor", "Task supervisor died, restarting it", logging.WARNING)
+    supervisor_task = asyncio.create_task(supervisor_worker(), name="supervisor")
+
+def update_date_monitoring_config():
     """
     Update date monitoring configuration based on environment variables or defaults.
     """
@@ -646,25 +1521,260 @@ def update_date_monitoring_config():
         try:
             # Parse the date string into a datetime object
             target_end_date = datetime.strptime(target_date_str, "%Y-%m-%d")
-            print(f"Looking for dates between today and {target_date_str} (from config)")
+            log_event("config", f"Looking for dates between today and {target_date_str} (from config)")
         except ValueError:
             # Fallback to default if date format is invalid
             target_end_date = datetime(2026, 1, 1)
-            print(f"Invalid date format in TARGET_END_DATE, using default: 2026-01-01")
+            log_event("config", "Invalid date format in TARGET_END_DATE, using default: 2026-01-01", logging.WARNING)
     else:
         # Fallback to default
         target_end_date = datetime(2026, 1, 1)
-        print(f"Looking for dates between today and 2026-01-01 (default)")
+        log_event("config", "Looking for dates between today and 2026-01-01 (default)")
+    
+    # Alert mode: ALERT_MODE=improvement alerts only on earlier dates (or dates before ALERT_THRESHOLD_DATE)
+    alert_changes = {
+        key: os.environ[variable]
+        for key, variable in (("alert_mode", "ALERT_MODE"), ("alert_threshold_date", "ALERT_THRESHOLD_DATE"))
+        if os.environ.get(variable)
+    }
+    try:
+        apply_config(alert_changes, "environment")
+    except ValueError as e:
+        log_event("config", f"Ignoring invalid alert settings: {e}", logging.WARNING)
     
     # Update Telegram configuration from environment variables
     telegram_bot_token = os.environ.get("TELEGRAM_BOT_TOKEN")
     
     if telegram_bot_token:
         telegram_enabled = True
-        print("Telegram alerts are enabled.")
+        log_event("config", "Telegram alerts are enabled.")
     else:
         telegram_enabled = False
-        print("Telegram alerts are disabled. Set TELEGRAM_BOT_TOKEN to enable.")
+        log_event("config", "Telegram alerts are disabled. Set TELEGRAM_BOT_TOKEN to enable.", logging.WARNING)
+
+def parse_config_value(key, value):
+    """
+    Validate and normalize a single configuration value.
+    Accepts native JSON values or strings (from bot commands).
+    Raises ValueError if the key is unknown or the value is invalid.
+    """
+    if key == "target_end_date":
+        if not isinstance(value, str):
+            raise ValueError("target_end_date must be a YYYY-MM-DD string")
+        return datetime.strptime(value, "%Y-%m-%d")
+    
+    if key == "skip_facilities":
+        if isinstance(value, str):
+            value = [v.strip() for v in value.split(",") if v.strip()]
+        if not isinstance(value, list):
+            raise ValueError("skip_facilities must be a list of facility IDs")
+        facilities = [str(v) for v in value]
+        unknown = [f for f in facilities if f not in facility_id_mapping]
+        if unknown:
+            raise ValueError(f"unknown facility IDs: {', '.join(unknown)}")
+        return facilities
+    
+    if key in ("relogin_minutes", "browser_restart_hours", "loop_interval_seconds", "supervisor_check_interval"):
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f"{key} must be a number")
+        number = float(value)
+        # inf would sleep forever and nan never compares as due
+        if not math.isfinite(number) or number <= 0:
+            raise ValueError(f"{key} must be a positive finite number")
+        return number
+    
+    if key == "alert_mode":
+        if not isinstance(value, str) or value.lower() not in ("new", "improvement"):
+            raise ValueError("alert_mode must be new or improvement")
+        return value.lower()
+    
+    if key == "alert_threshold_date":
+        if value is None or (isinstance(value, str) and value.lower() in ("", "none", "off")):
+            return None
+        if not isinstance(value, str):
+            raise ValueError("alert_threshold_date must be a YYYY-MM-DD string or off")
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    
+    if key == "telegram_enabled":
+        if isinstance(value, str):
+            if value.lower() not in ("true", "false", "on", "off", "1", "0"):
+                raise ValueError("telegram_enabled must be true or false")
+            return value.lower() in ("true", "on", "1")
+        if not isinstance(value, bool):
+            raise ValueError("telegram_enabled must be true or false")
+        return value
+    
+    if key == "telegram_bot_token":
+        if not isinstance(value, str) or ":" not in value:
+            raise ValueError("telegram_bot_token doesn't look like a bot token")
+        return value
+    
+    raise ValueError(f"unknown setting: {key}")
+
+def apply_config(changes, source):
+    """
+    Validate a set of configuration changes and apply them to the running components.
+    Either every change is applied or none is: all values are validated first, then
+    assigned together under config_lock.
+    Returns the list of changed keys; raises ValueError if any value is invalid.
+    """
+    global target_end_date, skip_facilities, telegram_enabled, telegram_bot_token
+    global scheduler_settings, supervisor_check_interval, alert_mode, alert_threshold_date
+    
+    parsed = {key: parse_config_value(key, value) for key, value in changes.items()}
+    
+    with config_lock:
+        settings = dict(scheduler_settings)
+        if "target_end_date" in parsed:
+            target_end_date = parsed["target_end_date"]
+        if "skip_facilities" in parsed:
+            skip_facilities = parsed["skip_facilities"]
+        if "alert_mode" in parsed:
+            alert_mode = parsed["alert_mode"]
+        if "alert_threshold_date" in parsed:
+            alert_threshold_date = parsed["alert_threshold_date"]
+        if "telegram_bot_token" in parsed:
+            telegram_bot_token = parsed["telegram_bot_token"]
+        if "telegram_enabled" in parsed:
+            telegram_enabled = parsed["telegram_enabled"]
+        if "relogin_minutes" in parsed:
+            settings["relogin_interval"] = parsed["relogin_minutes"] * 60
+        if "browser_restart_hours" in parsed:
+            settings["browser_restart_interval"] = parsed["browser_restart_hours"] * 3600
+        if "loop_interval_seconds" in parsed:
+            settings["loop_interval"] = parsed["loop_interval_seconds"]
+        if "supervisor_check_interval" in parsed:
+            supervisor_check_interval = parsed["supervisor_check_interval"]
+        scheduler_settings = settings
+    
+    if parsed:
+        log_event("config", f"Applied configuration from {source}: {', '.join(sorted(parsed))}", changed=sorted(parsed))
+    return sorted(parsed)
+
+def describe_config():
+    """Return the current live configuration as a JSON-serializable dict."""
+    with config_lock:
+        return {
+            "target_end_date": target_end_date.strftime("%Y-%m-%d"),
+            "skip_facilities": list(skip_facilities),
+            "alert_mode": alert_mode,
+            "alert_threshold_date": alert_threshold_date,
+            "relogin_minutes": scheduler_settings["relogin_interval"] / 60,
+            "browser_restart_hours": scheduler_settings["browser_restart_interval"] / 3600,
+            "loop_interval_seconds": scheduler_settings["loop_interval"],
+            "supervisor_check_interval": supervisor_check_interval,
+            "telegram_enabled": telegram_enabled
+        }
+
+def load_config_file(force=False):
+    """
+    Apply the config file if it changed since it was last applied.
+    An invalid file is rejected as a whole and the running configuration is kept.
+    Returns True if new configuration was applied.
+    """
+    global config_file_mtime
+    
+    try:
+        mtime = os.path.getmtime(config_file)
+    except OSError:
+        return False
+    if not force and mtime == config_file_mtime:
+        return False
+    config_file_mtime = mtime
+    
+    try:
+        with open(config_file, "r", encoding="utf-8") as f:
+            changes = json.load(f)
+        if not isinstance(changes, dict):
+            raise ValueError("config file must contain a JSON object")
+        apply_config(changes, config_file)
+        return True
+    except (ValueError, TypeError, OSError) as e:
+        log_event("config", f"Rejected config file {config_file}: {e}", logging.ERROR)
+        return False
+
+def save_config_file(changes):
+    """
+    Merge changes into the config file so they survive restarts.
+    Written atomically so the watcher never reads a half-written file.
+    """
+    global config_file_mtime
+    
+    current = {}
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, "r", encoding="utf-8") as f:
+                current = json.load(f)
+        except (ValueError, OSError):
+            current = {}
+    current.update(changes)
+    
+    temp_file = f"{config_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    os.replace(temp_file, config_file)
+    # Already applied; don't re-apply it when the watcher notices the new mtime
+    config_file_mtime = os.path.getmtime(config_file)
+
+async def config_watcher_worker(poll_interval=2):
+    """
+    Task that watches the config file and applies changes as they are saved.
+    Runs until cancelled.
+    """
+    while True:
+        heartbeat("config_watcher")
+        try:
+            if await asyncio.to_thread(load_config_file):
+                heartbeat("config_watcher", progressed=1)
+        except Exception as e:
+            log_event("config", f"Error in config watcher: {e}", logging.ERROR)
+        await asyncio.sleep(poll_interval)
+
+def handle_admin_command(chat_id, text):
+    """
+    Handle /config, /set and /status commands from admin chats.
+    /config shows the live configuration; /set <key> <value> validates, applies
+    and persists a change; /status shows the supervised tasks and the outbox. Credentials can't be set this way, since /set writes
+    to the config file. Returns True if the message was an admin command.
+    """
+    parts = text.split(maxsplit=2)
+    # In group chats Telegram sends commands as /command@botname
+    command = parts[0].split("@", 1)[0] if parts else ""
+    if command not in ("/config", "/set", "/status"):
+        return False
+    
+    if chat_id not in admin_chat_ids:
+        send_message_to_chat(chat_id, "This command is restricted to administrators.")
+        return True
+    
+    if command == "/config":
+        send_message_to_chat(chat_id, "Current configuration:\n" + json.dumps(describe_config(), indent=2))
+        return True
+    
+    if command == "/status":
+        status = {"workers": get_worker_status(), "outbox": alert_outbox.counts()}
+        send_message_to_chat(chat_id, "Status:\n" + json.dumps(status, indent=2))
+        return True
+    
+    if len(parts) < 3:
+        send_message_to_chat(chat_id, "Usage: /set <key> <value>")
+        return True
+    
+    key, value = parts[1], parts[2].strip()
+    if key in credential_config_keys:
+        send_message_to_chat(chat_id, f"Rejected: {key} can only be set in the environment or the config file.")
+        return True
+    try:
+        apply_config({key: value}, f"admin {chat_id}")
+        # Persist in the file's native types
+        persisted = parse_config_value(key, value)
+        if key == "target_end_date":
+            persisted = persisted.strftime("%Y-%m-%d")
+        save_config_file({key: persisted})
+        send_message_to_chat(chat_id, f"Updated {key}.")
+    except ValueError as e:
+        send_message_to_chat(chat_id, f"Rejected: {e}")
+    return True
 
 def continuous_monitoring(email, password, relogin_interval=300, browser_restart_interval=86400):
     """
@@ -676,151 +1786,489 @@ def continuous_monitoring(email, password, relogin_interval=300, browser_restart
         relogin_interval: Time in seconds between re-logins (default 5 minutes)
         browser_restart_interval: Time in seconds between full browser restarts (default 24 hours)
     """
-    global should_stop, driver, login_active, last_activity_time
+    if coordinator is not None and not os.getenv("OUTBOX_DB"):
+        # Only the leader drains the outbox, so a follower's alerts would never be sent
+        raise SystemExit("COORDINATION_DB is set but OUTBOX_DB is not: point OUTBOX_DB at an outbox shared by every instance")
     
     try:
         print("\n============= US VISA APPOINTMENT MONITOR =============")
         print("This tool checks for available visa appointment dates")
         print("=========================================================\n")
-        
-        # Update date monitoring configuration
+        asyncio.run(run_monitoring(email, password, relogin_interval, browser_restart_interval))
+    except KeyboardInterrupt:
+        print("\nMonitoring stopped by user")
+        raise  # Stop the program, including run_as_service's restart loop
+
+async def run_monitoring(email, password, relogin_interval, browser_restart_interval):
+    """
+    The detector process's event loop: start the browser controller process,
+    run the captures it streams back through detection, and run the alerting,
+    bot, config, checkpoint and coordination tasks. Cancelling this coroutine
+    (Ctrl+C) stops everything at once and goes straight to cleanup.
+    """
+    global telegram_last_update_id, facility_snapshots, browser_process
+    global runtime_loop, task_supervisor, supervisor_task, outbox_ready, telegram_http, capture_queue
+    
+    runtime_loop = asyncio.get_running_loop()
+    task_supervisor = TaskSupervisor()
+    supervisor_task = None
+    outbox_ready = asyncio.Event()
+    capture_queue = asyncio.Queue()
+    telegram_http = aiohttp.ClientSession()
+    
+    try:
+        # Update date monitoring configuration; the config file, if present, overrides it
         update_date_monitoring_config()
+        apply_config({
+            "relogin_minutes": relogin_interval / 60,
+            "browser_restart_hours": browser_restart_interval / 3600
+        }, "startup arguments")
+        load_config_file(force=True)
         
         # Create a single output directory for the entire session
         output_dir = create_output_directory()
-        print(f"Data will be saved to: {os.path.abspath(output_dir)}")
-        print(f"Date alerts will be saved to: {os.path.abspath(date_alerts_dir)}")
+        log_event("startup", f"Data will be saved to: {os.path.abspath(output_dir)}")
+        log_event("startup", f"Date alerts will be saved to: {os.path.abspath(date_alerts_dir)}")
         
-        # Initialize the driver
-        print("Initializing browser...")
-        driver = setup_driver()
+        # Pick up where the previous run left off
+        checkpoint = load_checkpoint()
+        if checkpoint:
+            telegram_last_update_id = checkpoint.get("telegram_last_update_id", 0)
+            facility_snapshots = checkpoint.get("facility_snapshots", {})
+            scheduler_state.update(checkpoint.get("scheduler", {}))
+            # Seed the date index so the first sweep isn't mistaken for an improvement
+            today, end = current_datetime().date().isoformat(), target_end_date.strftime("%Y-%m-%d")
+            for snapshot_facility, snapshot in facility_snapshots.items():
+                availability_index.observe(snapshot_facility, [d for d in snapshot["dates"] if d <= end], today)
+            log_event("checkpoint", "Loaded checkpoint", age_seconds=round(time.time() - checkpoint.get("saved_at", 0), 1))
         
-        # Enable network interception via CDP
-        driver.execute_cdp_cmd("Network.enable", {})
+        if coordinator is not None:
+            # Join the group before the browser starts so the first sweep only covers our facilities
+            await asyncio.to_thread(update_coordination)
         
-        # Start the consumer thread
-        consumer_thread = threading.Thread(
-            target=json_consumer_worker, 
-            args=(output_dir,),
-            daemon=True
-        )
-        consumer_thread.start()
+        # Start the browser controller; it logs in, sweeps and streams captures back
+        log_event("browser", "Starting browser process...")
+        browser_process = BrowserProcess(browser_controller_main, (email, password))
+        start_browser_process(output_dir, checkpoint)
         
-        # Start the network log monitor thread
-        monitor_thread = threading.Thread(
-            target=network_log_monitor, 
-            args=(output_dir,),
-            daemon=True
-        )
-        monitor_thread.start()
+        # Register the tasks with the supervisor and start them
+        # (the Telegram task long-polls for 30 seconds, so it gets a longer stall timeout)
+        task_supervisor.register("detector", lambda: detector_worker(output_dir), stall_timeout=30)
+        task_supervisor.register("browser_process", lambda: browser_process_worker(output_dir), stall_timeout=60)
+        task_supervisor.register("telegram_bot", telegram_bot_worker, stall_timeout=90)
+        task_supervisor.register("outbox_delivery", outbox_delivery_worker, stall_timeout=60)
+        task_supervisor.register("config_watcher", config_watcher_worker, stall_timeout=30)
+        task_supervisor.register("checkpoint", checkpoint_worker, stall_timeout=checkpoint_interval * 4)
+        if coordinator is not None:
+            task_supervisor.register("coordination", coordination_worker, stall_timeout=coordinator.lease_ttl)
+        task_supervisor.start_all()
         
-        # Start the Telegram bot worker thread
-        telegram_thread = threading.Thread(
-            target=telegram_bot_worker,
-            daemon=True
-        )
-        telegram_thread.start()
+        print("\nMonitoring has started. Press Ctrl+C to stop.\n")
         
-        # Initial login
-        if not login(email, password):
-            print("Initial login failed, stopping.")
-            return
+        # Everything else happens in the tasks; keep the supervisor itself running
+        while True:
+            ensure_supervisor()
+            await asyncio.sleep(scheduler_settings["loop_interval"])
+                
+    except Exception as main_error:
+        log_event("cycle", f"Error during monitoring: {main_error}", logging.ERROR, exc_info=True)
+    finally:
+        # Stop every task first, then the browser process, so nothing is left running
+        if supervisor_task is not None:
+            supervisor_task.cancel()
+        await task_supervisor.stop()
+        await telegram_http.close()
+        if browser_process is not None:
+            await stop_browser_process()
+        try:
+            save_checkpoint()
+        except Exception as e:
+            log_event("checkpoint", f"Error saving final checkpoint: {e}", logging.ERROR)
+        if coordinator is not None:
+            coordinator.leave()
+        availability_history.flush()
+        runtime_loop = None
+        log_event("cycle", "Monitoring stopped")
+        if DroppingQueueHandler.dropped:
+            log_event("logging", f"Dropped {DroppingQueueHandler.dropped} log records while the writer was behind", logging.WARNING)
+
+def browser_settings():
+    """The live settings the browser process needs, as sent in FRAME_SETTINGS frames."""
+    with config_lock:
+        return {
+            "scheduler_settings": dict(scheduler_settings),
+            "skip_facilities": list(skip_facilities),
+            "assigned_facilities": assigned_facilities
+        }
+
+def start_browser_process(output_dir, checkpoint=None):
+    """
+    Start the browser controller process and listen for its frames. The controller
+    gets the live settings and a session to resume: the checkpoint's at startup,
+    afterwards the one the previous controller last reported.
+    """
+    global last_activity_time
+    
+    if checkpoint is None and browser_cookies:
+        checkpoint = {
+            "saved_at": browser_state_at,
+            "cookies": browser_cookies,
+            "user_code": user_code,
+            "login_active": login_active,
+            "scheduler": dict(scheduler_state)
+        }
+    channel = browser_process.start({
+        "output_dir": output_dir,
+        "settings": browser_settings(),
+        "checkpoint": checkpoint
+    })
+    fd = channel.fileno()
+    runtime_loop.add_reader(fd, read_browser_frames, channel, fd)
+    # The inactivity check measures from this start, not from before the previous controller died
+    last_activity_time = time.time()
+
+async def stop_browser_process():
+    """
+    Stop the browser controller process. The pipe is unregistered here, on the
+    loop thread (loop methods aren't thread-safe); waiting for the controller to
+    close Chrome happens in a worker thread.
+    """
+    if browser_process.channel is not None:
+        try:
+            runtime_loop.remove_reader(browser_process.channel.fileno())
+        except (OSError, ValueError):
+            pass  # Already closed
+    await asyncio.to_thread(browser_process.stop)
+
+def read_browser_frames(channel, fd):
+    """
+    Drain the frames the browser process has sent. Called by the event loop
+    whenever the pipe is readable, so captures reach the detector as they arrive.
+    """
+    try:
+        while channel.poll():
+            kind, meta, payload = channel.recv()
+            if kind == FRAME_CAPTURE:
+                capture_queue.put_nowait((meta, payload))
+            elif kind == FRAME_LOG:
+                queue_handler.enqueue(record_from_frame(meta))
+            elif kind == FRAME_STATE:
+                apply_browser_state(meta)
+    except (EOFError, OSError):
+        # The controller exited; browser_process_worker notices and restarts it
+        runtime_loop.remove_reader(fd)
+
+def apply_browser_state(state):
+    """Take over the session state reported by the browser process."""
+    global user_code, login_active, browser_cookies, browser_state_at, last_activity_time
+    
+    user_code = state["user_code"]
+    login_active = state["login_active"]
+    if state.get("cookies") is not None:
+        browser_cookies = state["cookies"]
+    scheduler_state.update(state["scheduler"])
+    last_activity_time = max(last_activity_time, state["last_activity_time"])
+    browser_state_at = browser_process.last_seen = time.time()
+
+async def browser_process_worker(output_dir):
+    """
+    Task that keeps the browser controller process running: it restarts the
+    process when it exits, stops reporting, or stops capturing, backing off
+    exponentially after repeated quick failures, and sends it settings changes.
+    A back-off is a scheduled restart time checked on every tick, not a sleep,
+    so the task keeps sending heartbeats (and a replacement task picks up the
+    same schedule). Detection and alerting keep running throughout. Runs until cancelled.
+    """
+    global browser_process_failures, browser_process_restart_at
+    
+    sent_settings = None
+    while True:
+        heartbeat("browser_process")
+        try:
+            now = time.time()
+            if browser_process_restart_at is not None:
+                if now >= browser_process_restart_at:
+                    browser_process_restart_at = None
+                    start_browser_process(output_dir)
+                    sent_settings = None
+                else:
+                    await asyncio.sleep(min(supervisor_check_interval, browser_process_restart_at - now))
+                    continue
             
-        # Main loop - Keep running until manually stopped
-        last_login_time = time.time()
-        last_browser_restart_time = time.time()
-        refresh_count = 0
+            reason = None
+            if not browser_process.is_alive():
+                reason = f"exited with code {browser_process.exitcode}"
+            elif now - browser_process.last_seen > browser_process_stall_timeout:
+                reason = f"sent no state for {now - browser_process.last_seen:.0f} seconds"
+            elif now - last_activity_time > browser_process_max_inactivity:
+                reason = f"captured nothing for {now - last_activity_time:.0f} seconds"
+            
+            if reason:
+                if now - browser_process.started_at > browser_process_healthy_run:
+                    browser_process_failures = 0
+                delay = 0 if browser_process_failures == 0 else min(5 * 2 ** (browser_process_failures - 1), 300)
+                browser_process_failures += 1
+                log_event(
+                    "browser", f"Browser process {reason}, restarting it in {delay} seconds", logging.WARNING,
+                    failures=browser_process_failures
+                )
+                await stop_browser_process()
+                browser_process_restart_at = time.time() + delay
+                continue
+            
+            settings = browser_settings()
+            if settings != sent_settings:
+                await asyncio.to_thread(browser_process.channel.send, FRAME_SETTINGS, settings)
+                sent_settings = settings
+        except Exception as e:
+            log_event("browser", f"Error supervising the browser process: {e}", logging.ERROR)
+        await asyncio.sleep(supervisor_check_interval)
+
+def browser_controller_main(conn, email, password, startup):
+    """
+    Entry point of the browser controller process. Drives Chrome until the
+    detector process sends a stop frame or goes away. Log records are sent
+    to the detector, which writes the log files for both processes.
+    """
+    global capture_channel
+    
+    capture_channel = FrameChannel(conn)
+    log_listener.stop()
+    log_listener.handlers = (ChannelLogHandler(capture_channel),)
+    log_listener.start()
+    try:
+        asyncio.run(run_browser_controller(email, password, startup))
+    except KeyboardInterrupt:
+        pass  # Sent directly (the controller has its own process group); the detector handles shutdown
+    except Exception as e:
+        log_event("browser", f"Browser process failed: {e}", logging.ERROR, exc_info=True)
+        raise SystemExit(1)
+    finally:
+        log_listener.stop()
+
+async def run_browser_controller(email, password, startup):
+    """
+    The browser process's event loop: start Chrome, log in (or resume the
+    session it was given), capture network traffic and stream it to the
+    detector, and run the re-login and restart schedule.
+    """
+    global runtime_loop, task_supervisor, supervisor_task, json_queue
+    
+    runtime_loop = asyncio.get_running_loop()
+    task_supervisor = TaskSupervisor()
+    supervisor_task = None
+    # Queues bind to the loop that first waits on them, so each run gets its own
+    json_queue = asyncio.Queue()
+    apply_browser_settings(startup["settings"])
+    scheduler_state.update((startup.get("checkpoint") or {}).get("scheduler", {}))
+    fd = capture_channel.fileno()
+    runtime_loop.add_reader(fd, read_control_frames, asyncio.current_task(), fd)
+    
+    try:
+        # Report state from the start, so the detector knows the process is alive while Chrome starts
+        task_supervisor.register("session_reporter", session_reporter_worker, stall_timeout=60)
+        task_supervisor.start("session_reporter")
         
-        print("\nMonitoring has started. Press Ctrl+C to stop.\n")
+        log_event("browser", "Initializing browser...")
+        await run_in_browser(start_browser)
+        
+        output_dir = startup["output_dir"]
+        task_supervisor.register("network_log_monitor", lambda: network_log_monitor(output_dir), stall_timeout=15)
+        task_supervisor.register("json_consumer", json_consumer_worker, stall_timeout=30)
+        task_supervisor.start("network_log_monitor")
+        task_supervisor.start("json_consumer")
+        ensure_supervisor()
         
-        while not should_stop:
+        await browser_scheduler(email, password, output_dir, startup.get("checkpoint"))
+    finally:
+        if supervisor_task is not None:
+            supervisor_task.cancel()
+        await task_supervisor.stop()
+        runtime_loop.remove_reader(fd)
+        if driver:
+            await run_in_browser(driver.quit)
+        log_event("browser", "Browser process stopped")
+
+def read_control_frames(main_task, fd):
+    """
+    Handle the frames the detector has sent (called by the event loop when the
+    pipe is readable). If the detector is gone, shut down rather than drive
+    Chrome unattended.
+    """
+    try:
+        while capture_channel.poll():
+            kind, meta, _ = capture_channel.recv()
+            if kind == FRAME_SETTINGS:
+                apply_browser_settings(meta)
+            elif kind == FRAME_STOP:
+                main_task.cancel()
+    except (EOFError, OSError):
+        runtime_loop.remove_reader(fd)
+        main_task.cancel()
+
+def apply_browser_settings(settings):
+    """Apply the settings sent by the detector process."""
+    global scheduler_settings, skip_facilities, assigned_facilities
+    
+    with config_lock:
+        scheduler_settings = dict(settings["scheduler_settings"])
+        skip_facilities = list(settings["skip_facilities"])
+    assigned_facilities = settings["assigned_facilities"]
+
+def browser_session_state(include_cookies=True):
+    """Snapshot of the browser session for the detector (blocking: reads the browser's cookies)."""
+    state = {
+        "user_code": user_code,
+        "login_active": login_active,
+        "cookies": None,
+        "scheduler": dict(scheduler_state),
+        "last_activity_time": last_activity_time
+    }
+    if include_cookies and driver is not None and login_active:
+        state["cookies"] = driver.get_cookies()
+    return state
+
+async def session_reporter_worker():
+    """
+    Task that sends the session state to the detector every browser_state_interval
+    seconds; it is also the browser process's heartbeat. If reading the cookies
+    hangs, the state is still sent (without cookies) so a stuck WebDriver call
+    doesn't look like a dead process. Runs until cancelled.
+    """
+    while True:
+        heartbeat("session_reporter")
+        try:
             try:
-                current_time = time.time()
-                time_since_login = current_time - last_login_time
-                time_since_browser_restart = current_time - last_browser_restart_time
+                state = await asyncio.wait_for(run_in_browser(browser_session_state), timeout=browser_state_interval)
+            except (asyncio.TimeoutError, WebDriverException):
+                state = browser_session_state(include_cookies=False)
+            await asyncio.to_thread(capture_channel.send, FRAME_STATE, state)
+            heartbeat("session_reporter", progressed=1)
+        except Exception as e:
+            log_event("browser", f"Error reporting session state: {e}", logging.ERROR)
+        await asyncio.sleep(browser_state_interval)
+
+async def browser_scheduler(email, password, output_dir, checkpoint=None):
+    """
+    Log in (or resume the given session), then run the re-login and browser
+    restart schedule until cancelled. Blocking browser steps run in the browser
+    executor; returns only if the initial login fails.
+    """
+    global current_cycle_id
+    
+    # Initial login, unless the checkpointed session is still valid
+    last_login_time = time.time()
+    if checkpoint and await run_in_browser(resume_session, checkpoint):
+        last_login_time = checkpoint.get("scheduler", {}).get("last_login_time") or last_login_time
+    elif not await run_in_browser(login, email, password):
+        log_event("login", "Initial login failed, stopping.", logging.ERROR)
+        return
+        
+    # Main loop - Keep running until cancelled
+    last_browser_restart_time = time.time()
+    refresh_count = scheduler_state.get("refresh_count", 0)
+    
+    while True:
+        try:
+            # Take one snapshot of the scheduler settings for the whole iteration
+            settings = scheduler_settings
+            relogin_interval = settings["relogin_interval"]
+            browser_restart_interval = settings["browser_restart_interval"]
+            
+            current_time = time.time()
+            time_since_login = current_time - last_login_time
+            time_since_browser_restart = current_time - last_browser_restart_time
+            
+            refresh_count += 1
+            current_cycle_id = refresh_count
+            log_event("cycle", f"Refresh #{refresh_count}: Checking for appointment dates... ({datetime.now().strftime('%H:%M:%S')})")
+            
+            # Check if it's time for browser restart (once a day by default)
+            if time_since_browser_restart >= browser_restart_interval:
+                log_event("browser", f"Time for scheduled browser restart (after {browser_restart_interval/3600:g} hours)")
                 
-                refresh_count += 1
-                print(f"Refresh #{refresh_count}: Checking for appointment dates... ({datetime.now().strftime('%H:%M:%S')})")
+                if await run_in_browser(restart_browser, email, password, output_dir):
+                    last_login_time = time.time()
+                    last_browser_restart_time = time.time()
+                    log_event("browser", "Scheduled browser restart and re-login successful")
+                else:
+                    log_event("browser", "Scheduled browser restart failed, will retry in 60 seconds", logging.ERROR)
+                    await asyncio.sleep(60)
+                    continue
+            
+            # Check if it's time to re-login or if we're logged out
+            elif time_since_login >= relogin_interval or not await run_in_browser(is_logged_in):
+                log_event("login", f"Re-login required (after {relogin_interval/60:g} minutes)")
                 
-                # Check if it's time for browser restart (once a day by default)
-                if time_since_browser_restart >= browser_restart_interval:
-                    print(f"Time for scheduled browser restart (after {browser_restart_interval//3600} hours)")
-                    
-                    if restart_browser(email, password, output_dir):
-                        last_login_time = time.time()
-                        last_browser_restart_time = time.time()
-                        print("Scheduled browser restart and re-login successful")
-                    else:
-                        print("Scheduled browser restart failed, will retry in 60 seconds")
-                        time.sleep(60)
-                        continue
+                # Replace the session's browser context for a truly fresh session without browser restart
+                await run_in_browser(browser_host.recycle_session, primary_session)
                 
-                # Check if it's time to re-login or if we're logged out
-                elif time_since_login >= relogin_interval or not is_logged_in():
-                    print(f"Re-login required (after {relogin_interval//60} minutes)")
+                if await run_in_browser(login, email, password):
+                    last_login_time = time.time()
+                    log_event("login", "Re-login successful")
                     
-                    # Clear cookies to simulate a fresh session without browser restart
-                    driver.delete_all_cookies()
-                    time.sleep(2)
-                    
-                    if login(email, password):
-                        last_login_time = time.time()
-                        print("Re-login successful")
-                        
-                        # Refresh the schedule page to generate new network activity
-                        if user_code:
-                            schedule_url = f"{base_url}/en-ca/niv/schedule/{user_code}"
-                            driver.get(schedule_url)
-                            print(f"Refreshed appointment schedule page")
-                    else:
-                        print("Re-login failed, attempting browser restart")
-                        # Try a full browser restart as fallback
-                        if restart_browser(email, password, output_dir):
-                            last_login_time = time.time()
-                            last_browser_restart_time = time.time()
-                            print("Emergency browser restart successful")
-                        else:
-                            print("Emergency browser restart failed, will retry in 2 minutes")
-                            time.sleep(120)
-                            continue
-                
-                # Health check - if system appears stuck, restart browser
-                if not health_check():
-                    print("System appears to be stuck, restarting browser")
-                    if restart_browser(email, password, output_dir):
+                    # Refresh the schedule page to generate new network activity
+                    if user_code:
+                        schedule_url = f"{base_url}/en-ca/niv/schedule/{user_code}"
+                        await run_in_browser(driver.get, schedule_url)
+                        log_event("login", "Refreshed appointment schedule page")
+                else:
+                    log_event("login", "Re-login failed, attempting browser restart", logging.WARNING)
+                    # Try a full browser restart as fallback
+                    if await run_in_browser(restart_browser, email, password, output_dir):
                         last_login_time = time.time()
                         last_browser_restart_time = time.time()
-                        print("System recovered successfully")
+                        log_event("browser", "Emergency browser restart successful")
                     else:
-                        print("Recovery failed, will retry")
-                        time.sleep(60)
-                
-                # Sleep a bit to avoid tight looping
-                time.sleep(10)
-                
-            except Exception as loop_error:
-                print(f"Error in monitoring loop: {loop_error}")
-                
-                # Wait a bit before continuing
-                time.sleep(30)
-                
-    except KeyboardInterrupt:
-        print("\nMonitoring stopped by user")
-    except Exception as main_error:
-        print(f"Error during monitoring: {main_error}")
-    finally:
-        # Ensure proper cleanup
-        should_stop = True
-        if driver:
-            driver.quit()
-        print("Monitoring stopped")
+                        log_event("browser", "Emergency browser restart failed, will retry in 2 minutes", logging.ERROR)
+                        await asyncio.sleep(120)
+                        continue
+            
+            # Make sure the supervisor itself is still running
+            ensure_supervisor()
+            
+            # Health check - if system appears stuck, restart browser
+            if not health_check():
+                log_event("health", "System appears to be stuck, restarting browser", logging.WARNING)
+                if await run_in_browser(restart_browser, email, password, output_dir):
+                    last_login_time = time.time()
+                    last_browser_restart_time = time.time()
+                    log_event("health", "System recovered successfully")
+                else:
+                    log_event("health", "Recovery failed, will retry", logging.ERROR)
+                    await asyncio.sleep(60)
+            
+            # Publish the timers for the checkpoint
+            scheduler_state.update(
+                last_login_time=last_login_time,
+                last_browser_restart_time=last_browser_restart_time,
+                refresh_count=refresh_count
+            )
+            
+            # Sleep a bit to avoid tight looping
+            await asyncio.sleep(settings["loop_interval"])
+            
+        except Exception as loop_error:
+            log_event("cycle", f"Error in monitoring loop: {loop_error}", logging.ERROR, exc_info=True)
+            
+            # Wait a bit before continuing
+            await asyncio.sleep(30)
+
+# Service restart back-off: runs shorter than service_healthy_run seconds count as crashes
+service_healthy_run = 600
+service_backoff_base = 5
 
 def run_as_service():
     """
     Run the script as a persistent service with restart capability.
-    This function never returns unless the program is forcibly terminated.
+    This function never returns; Ctrl+C (KeyboardInterrupt) propagates out of it.
+    A run that ends is restarted immediately (resuming from the checkpoint); only
+    repeated quick failures back off exponentially, up to 5 minutes.
     """
+    consecutive_failures = 0
+    
     while True:
+        run_started = time.time()
         try:
             # Get credentials from environment or config file for service mode
             email = os.environ.get("EMAIL") or input("Enter your email: ")
@@ -856,14 +2304,18 @@ def run_as_service():
             continuous_monitoring(email, password, relogin_interval, browser_restart_interval)
             
             # If we get here, monitoring has stopped for some reason
-            # Wait a bit before restarting
-            print("Monitoring stopped unexpectedly, restarting in 5 minutes...")
-            time.sleep(300)
+            print("Monitoring stopped unexpectedly")
             
         except Exception as service_error:
             print(f"Critical service error: {service_error}")
-            print("Restarting service in 5 minutes...")
-            time.sleep(300)
+        
+        # A run that lasted a while was healthy, so start over without delay
+        if time.time() - run_started > service_healthy_run:
+            consecutive_failures = 0
+        delay = 0 if consecutive_failures == 0 else min(service_backoff_base * 2 ** (consecutive_failures - 1), 300)
+        consecutive_failures += 1
+        print(f"Restarting service in {delay} seconds...")
+        time.sleep(delay)
 
 def handle_telegram_command(message):
     """
@@ -880,6 +2332,10 @@ def handle_telegram_command(message):
         chat_id = str(message['message']['chat']['id'])
         text = message['message'].get('text', '')
         
+        # Admin configuration commands
+        if handle_admin_command(chat_id, text):
+            return True
+        
         # Handle /start command
         if text == '/start':
             # Add the user to subscribers if not already there
@@ -888,7 +2344,7 @@ def handle_telegram_command(message):
                 save_telegram_subscribers()
             
             # Send welcome message
-            welcome_message = f"🔴 Bot is running! 🔴\nYou will receive alerts when new visa appointment slots become available.\n Checking slot dates till {os.environ.get('TARGET_END_DATE')}"
+            welcome_message = f"🔴 Bot is running! 🔴\nYou will receive alerts when new visa appointment slots become available.\n Checking slot dates till {target_end_date.strftime('%Y-%m-%d')}"
             send_message_to_chat(chat_id, welcome_message)
             return True
             
@@ -902,7 +2358,7 @@ def handle_telegram_command(message):
             
         return False
     except Exception as e:
-        print(f"Error handling Telegram command: {e}")
+        log_event("telegram", f"Error handling Telegram command: {e}", logging.ERROR)
         return False
 
 def send_message_to_chat(chat_id, message):
@@ -923,92 +2379,253 @@ def send_message_to_chat(chat_id, message):
         response.raise_for_status()
         return True
     except Exception as e:
-        print(f"Error sending Telegram message to {chat_id}: {e}")
+        log_event("telegram", f"Error sending Telegram message to {chat_id}: {e}", logging.ERROR, chat_id=chat_id)
         return False
 
-def get_telegram_updates(offset=0):
+def load_webhook_sinks():
     """
-    Get updates from Telegram bot API.
-    Returns a list of updates.
+    Create webhook sinks from environment variables.
+    WEBHOOK_URLS is a comma-separated list of endpoints; WEBHOOK_SECRET,
+    WEBHOOK_BATCH_SIZE, WEBHOOK_BATCH_LINGER and WEBHOOK_MAX_CONCURRENCY
+    apply to all of them.
     """
-    if not telegram_enabled or not telegram_bot_token:
-        return []
-    
+    sinks = {}
+    urls = [u.strip() for u in os.getenv("WEBHOOK_URLS", "").split(",") if u.strip()]
+    for index, webhook_url in enumerate(urls):
+        name = f"webhook{index + 1}"
+        sinks[name] = WebhookSink(
+            name,
+            webhook_url,
+            secret=os.getenv("WEBHOOK_SECRET") or None,
+            batch_size=int(os.getenv("WEBHOOK_BATCH_SIZE", "50")),
+            batch_linger=float(os.getenv("WEBHOOK_BATCH_LINGER", "2")),
+            max_concurrency=int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "2"))
+        )
+    return sinks
+
+# Notification sinks by name; outbox records are routed to them by their sink column
+notification_sinks = {
+    "telegram": TelegramSink(
+        lambda: telegram_bot_token if telegram_enabled else None,
+        lambda: telegram_subscribers
+    ),
+    **load_webhook_sinks()
+}
+delivery_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="delivery")
+broadcast_target = "*"  # Outbox target meaning "every target the sink has when the record is delivered"
+
+def enqueue_alert(message, alert=None):
+    """
+    Queue an alert in the durable outbox for every enabled sink.
+    message is the human-readable text; alert is the structured form sent to webhooks.
+    The record is addressed to all of the sink's targets (broadcast_target); the
+    delivering instance fans it out to the targets it knows at delivery time,
+    so followers never address alerts from a stale subscriber list.
+    Returns immediately; delivery happens in outbox_delivery_worker.
+    Returns the number of records queued.
+    """
+    payload = dict(alert or {}, text=message)
+    queued = 0
+    for sink in notification_sinks.values():
+        if not sink.enabled:
+            continue
+        alert_outbox.enqueue(sink.name, broadcast_target, payload, delay=sink.batch_linger)
+        queued += 1
+    if queued:
+        wake_outbox_delivery()
+    log_event("alert", f"Queued alert for {queued} sink(s)", sinks=queued)
+    return queued
+
+def fan_out_outbox_record(sink, record):
+    """
+    Replace a record addressed to all of a sink's targets with one record per
+    current target, each delivered and retried on its own. The alert's times
+    are looked up first, so every copy carries them.
+    """
+    payload = enrich_alert_payload(record["payload"])
+    targets = sink.targets()
+    alert_outbox.fan_out(
+        record["id"], [(sink.name, target, payload) for target in targets], {"recipients": len(targets)}
+    )
+
+def deliver_outbox_batch(sink, target, records):
+    """
+    Deliver a batch of claimed outbox records for one sink target and record
+    the outcome of each in the outbox.
+    """
+    started = time.perf_counter()
     try:
-        url = f"https://api.telegram.org/bot{telegram_bot_token}/getUpdates"
-        params = {
-            "offset": offset,
-            "timeout": 30
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get('result', [])
+        receipt = sink.deliver(target, [record["payload"] for record in records])
+        for record in records:
+            alert_outbox.mark_delivered(record["id"], receipt)
+        log_event(
+            "alert", f"Delivered {len(records)} alert(s) via {sink.name} to {target}",
+            sink=sink.name,
+            target=target,
+            batch_size=len(records),
+            duration_ms=round((time.perf_counter() - started) * 1000, 3)
+        )
     except Exception as e:
-        print(f"Error getting Telegram updates: {e}")
-        return []
+        for record in records:
+            will_retry = alert_outbox.mark_failed(
+                record["id"], e, getattr(e, "retry_after", None), getattr(e, "retryable", True)
+            )
+            log_event(
+                "alert",
+                f"Error delivering alert via {sink.name} to {target}: {e}" + ("" if will_retry else " (giving up)"),
+                logging.WARNING if will_retry else logging.ERROR,
+                sink=sink.name,
+                target=target,
+                attempts=record["attempts"] + 1
+            )
 
-def telegram_bot_worker():
+def deliver_outbox_records(records, progress=None):
     """
-    Worker thread that checks for Telegram bot updates.
-    Will keep running until should_stop is set to True.
+    Group claimed records by sink and target, split them into batches of the
+    sink's batch size and deliver the batches concurrently. Each sink bounds
+    its own concurrency, so a slow endpoint can't starve the others. Broadcast
+    records are fanned out instead; their copies are claimed on the next pass.
+    progress(n) is called with the number of records handled after each
+    fan-out and each finished batch, so a long pass can keep reporting liveness.
     """
-    global should_stop
+    progress = progress or (lambda handled: None)
+    groups = defaultdict(list)
+    for record in records:
+        sink = notification_sinks.get(record["sink"])
+        if sink is None:
+            alert_outbox.mark_failed(record["id"], f"Unknown sink: {record['sink']}")
+            continue
+        if record["target"] == broadcast_target:
+            fan_out_outbox_record(sink, record)
+            progress(1)
+            continue
+        groups[(record["sink"], record["target"])].append(record)
     
-    print("Starting Telegram bot worker...")
-    last_update_id = 0
-    
-    while not should_stop:
+    futures = {}
+    for (sink_name, target), group in groups.items():
+        sink = notification_sinks[sink_name]
+        for i in range(0, len(group), sink.batch_size):
+            batch = group[i:i + sink.batch_size]
+            futures[delivery_executor.submit(deliver_outbox_batch, sink, target, batch)] = len(batch)
+    for future in as_completed(futures):
+        future.result()
+        progress(futures[future])
+
+def wake_outbox_delivery():
+    """Wake the delivery task; safe to call from any thread (alerts are enqueued off the loop)."""
+    loop = runtime_loop
+    if loop is not None and outbox_ready is not None:
         try:
-            # Get updates with long polling
-            updates = get_telegram_updates(last_update_id)
-            
-            for update in updates:
-                # Process the update
-                handle_telegram_command(update)
+            loop.call_soon_threadsafe(outbox_ready.set)
+        except RuntimeError:
+            pass  # The loop has just closed
+
+async def outbox_delivery_worker():
+    """
+    Task that drains the alert outbox, retrying failed sends with back-off.
+    Sinks are blocking clients with their own connection pools and concurrency
+    limits, so batches are delivered in the delivery executor. Runs until cancelled.
+    """
+    log_event("alert", "Starting outbox delivery worker...")
+    last_prune = 0
+    
+    try:
+        while True:
+            heartbeat("outbox_delivery")
+            try:
+                if not is_alert_leader():
+                    await asyncio.sleep(1)
+                    continue
                 
-                # Update the last update ID
-                if update['update_id'] >= last_update_id:
-                    last_update_id = update['update_id'] + 1
-            
-            # Sleep a bit to avoid hammering the API
-            time.sleep(1)
-        except Exception as e:
-            print(f"Error in Telegram bot worker: {e}")
-            time.sleep(5)  # Sleep longer on error
+                records = await asyncio.to_thread(alert_outbox.claim_due, 200)
+                if records:
+                    # A pass over a slow sink can outlast the stall timeout; heartbeat as batches finish
+                    await asyncio.to_thread(
+                        deliver_outbox_records, records,
+                        lambda handled: heartbeat("outbox_delivery", progressed=handled)
+                    )
+                
+                if time.time() - last_prune > 3600:
+                    await asyncio.to_thread(alert_outbox.prune)
+                    last_prune = time.time()
+                
+                if not records:
+                    # Sleep until the next retry is due or a new alert is enqueued; the timeout
+                    # picks up alerts other instances put in a shared outbox
+                    next_due = await asyncio.to_thread(alert_outbox.next_due_in)
+                    try:
+                        await asyncio.wait_for(outbox_ready.wait(), 5 if next_due is None else min(next_due, 5))
+                    except asyncio.TimeoutError:
+                        pass
+                    outbox_ready.clear()
+            except Exception as e:
+                log_event("alert", f"Error in outbox delivery worker: {e}", logging.ERROR)
+                await asyncio.sleep(5)
+    finally:
+        log_event("alert", "Outbox delivery worker stopped.")
+
+async def get_telegram_updates(offset=0):
+    """
+    Long-poll the Telegram bot API for updates without holding a thread.
+    Returns a list of updates, or None if the request failed.
+    """
+    if not telegram_enabled or not telegram_bot_token:
+        return []
     
-    print("Telegram bot worker stopped.")
+    try:
+        url = f"https://api.telegram.org/bot{telegram_bot_token}/getUpdates"
+        params = {
+            "offset": offset,
+            "timeout": 30
+        }
+        # Bound the request so a dead connection can't hang the task past the long poll
+        async with telegram_http.get(url, params=params, timeout=aiohttp.ClientTimeout(total=params["timeout"] + 10)) as response:
+            response.raise_for_status()
+            return (await response.json()).get('result', [])
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        log_event("telegram", f"Error getting Telegram updates: {e}", logging.ERROR)
+        return None
 
-def send_telegram_alert(message):
+async def telegram_bot_worker():
     """
-    Send an alert message via Telegram bot API to all subscribers.
-    Returns True if successful, False otherwise.
+    Task that long-polls for Telegram bot updates and handles them. Runs until cancelled.
+    The update offset is kept in a global so a restarted task resumes
+    where the previous one stopped instead of reprocessing old updates.
     """
-    global telegram_enabled, telegram_bot_token, telegram_subscribers
+    global telegram_last_update_id
     
-    if not telegram_enabled or not telegram_bot_token or not telegram_subscribers:
-        return False
+    log_event("telegram", "Starting Telegram bot worker...")
     
     try:
-        url = f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage"
-        success = True
-        
-        for chat_id in telegram_subscribers:
-            data = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "Markdown"
-            }
+        while True:
+            heartbeat("telegram_bot")
             try:
-                response = requests.post(url, data=data)
-                response.raise_for_status()
+                # Only one instance may long-poll the bot, Telegram rejects concurrent getUpdates
+                if not is_alert_leader() or not telegram_enabled or not telegram_bot_token:
+                    await asyncio.sleep(1)
+                    continue
+                
+                # Get updates with long polling
+                updates = await get_telegram_updates(telegram_last_update_id)
+                if updates is None:
+                    await asyncio.sleep(5)  # Back off after a failed poll
+                    continue
+                
+                for update in updates:
+                    # Commands write files and reply, so they are handled off the loop
+                    await asyncio.to_thread(handle_telegram_command, update)
+                    
+                    # Update the last update ID
+                    if update['update_id'] >= telegram_last_update_id:
+                        telegram_last_update_id = update['update_id'] + 1
+                
+                if updates:
+                    heartbeat("telegram_bot", progressed=len(updates))
             except Exception as e:
-                print(f"Error sending alert to {chat_id}: {e}")
-                success = False
-        
-        return success
-    except Exception as e:
-        print(f"Error sending Telegram alerts: {e}")
-        return False
+                log_event("telegram", f"Error in Telegram bot worker: {e}", logging.ERROR)
+                await asyncio.sleep(5)  # Sleep longer on error
+    finally:
+        log_event("telegram", "Telegram bot worker stopped.")
 
 if __name__ == "__main__":
     try:
@@ -1050,5 +2667,10 @@ if __name__ == "__main__":
             
             continuous_monitoring(email, password, relogin_interval, browser_restart_interval)
             
+    except KeyboardInterrupt:
+        pass  # Stopped by the user
     except Exception as e:
-        print(f"Main program error: {e}")
\ No newline at end of file
+        print(f"Main program error: {e}")
+    finally:
+        # Flush any queued log records before exiting
+        log_listener.stop()
\ No newline at end of file
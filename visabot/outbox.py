@@ -0,0 +1,218 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class Outbox:
+    """
+    Durable queue of outgoing alert messages backed by SQLite.
+
+    Detection enqueues one record per recipient and returns immediately; a
+    delivery worker claims due records, sends them and marks them delivered
+    (with a receipt) or failed. Failed records are retried with exponential
+    back-off until max_attempts, after which they are marked dead. Records
+    survive process restarts: records left in the "sending" state by a crash
+    are put back to "pending" when the outbox is opened again.
+
+    The outbox can be shared by several instances, each passing its own stable
+    owner ID. Claims record who made them and when; on open an instance only
+    re-queues its own claims, and another instance's claim is re-queued once
+    it is older than claim_timeout (because that instance died). Claims are
+    made in an immediate transaction so two instances never claim the same record.
+    With owner=None the outbox is assumed to have a single user and every
+    claim is re-queued on open.
+    """
+
+    def __init__(self, path, max_attempts=8, base_delay=2, max_delay=600, claim_timeout=300, owner=None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.claim_timeout = claim_timeout
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sink TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL,
+                    last_error TEXT,
+                    receipt TEXT,
+                    claimed_at REAL,
+                    claimed_by TEXT
+                )
+            """)
+            columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+            if "claimed_at" not in columns:
+                self.conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+            if "claimed_by" not in columns:
+                self.conn.execute("ALTER TABLE outbox ADD COLUMN claimed_by TEXT")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)"
+            )
+            if owner is None:
+                # Nobody else sends from this outbox, so every claim died with the last run
+                self.conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+            else:
+                self.conn.execute(
+                    "UPDATE outbox SET status = 'pending' WHERE status = 'sending' AND claimed_by = ?", (owner,)
+                )
+                self._release_stale_claims(time.time())
+
+    def _release_stale_claims(self, now):
+        # Records whose sender died mid-delivery are retried; claims younger than
+        # claim_timeout may still be in flight on another instance
+        self.conn.execute(
+            "UPDATE outbox SET status = 'pending' WHERE status = 'sending' "
+            "AND (claimed_at IS NULL OR claimed_at < ?)",
+            (now - self.claim_timeout,)
+        )
+
+    def enqueue(self, sink, target, payload, delay=0):
+        """
+        Add a message for one recipient of a sink. payload must be JSON-serializable.
+        delay holds the record back for that many seconds (used to let batches fill up).
+        Returns the record ID.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (sink, target, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (sink, str(target), json.dumps(payload), now + delay, now)
+            )
+        return cursor.lastrowid
+
+    def fan_out(self, record_id, copies, receipt=None):
+        """
+        Replace a claimed record with copies, each a (sink, target, payload) tuple,
+        and mark it delivered with the receipt. Done in one transaction, so a crash
+        can't leave both the copies and the original to be sent.
+        Returns the IDs of the copies.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            ids = [
+                self.conn.execute(
+                    "INSERT INTO outbox (sink, target, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (sink, str(target), json.dumps(payload), now, now)
+                ).lastrowid
+                for sink, target, payload in copies
+            ]
+            self.conn.execute(
+                "UPDATE outbox SET status = 'delivered', attempts = attempts + 1, "
+                "delivered_at = ?, receipt = ?, last_error = NULL WHERE id = ?",
+                (now, json.dumps(receipt), record_id)
+            )
+        return ids
+
+    def claim_due(self, limit=50, now=None):
+        """
+        Claim up to `limit` records whose next attempt is due, marking them as being sent.
+        Once a sink target has a due record, its other new records still waiting
+        out their batch linger are claimed with it, so a burst that arrived over
+        the linger window goes out together. Records waiting to be retried keep
+        their back-off. Returns a list of dicts with id, sink, target, payload and attempts.
+        """
+        now = time.time() if now is None else now
+        with self.lock, self.conn:
+            # Take the write lock before reading, so another instance can't claim the same rows
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._release_stale_claims(time.time())
+            rows = self.conn.execute(
+                "SELECT id, sink, target, payload, attempts FROM outbox "
+                "WHERE status = 'pending' AND (next_attempt_at <= ? OR (attempts = 0 AND (sink, target) IN ("
+                "    SELECT sink, target FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+                "))) ORDER BY id LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            if rows:
+                claimed_at = time.time()
+                self.conn.executemany(
+                    "UPDATE outbox SET status = 'sending', claimed_at = ?, claimed_by = ? WHERE id = ?",
+                    [(claimed_at, self.owner, row["id"]) for row in rows]
+                )
+        return [
+            {
+                "id": row["id"],
+                "sink": row["sink"],
+                "target": row["target"],
+                "payload": json.loads(row["payload"]),
+                "attempts": row["attempts"],
+            }
+            for row in rows
+        ]
+
+    def mark_delivered(self, record_id, receipt=None):
+        """Record a successful delivery along with the sink's receipt."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET status = 'delivered', attempts = attempts + 1, "
+                "delivered_at = ?, receipt = ?, last_error = NULL WHERE id = ?",
+                (time.time(), json.dumps(receipt), record_id)
+            )
+
+    def mark_failed(self, record_id, error, retry_after=None, retryable=True):
+        """
+        Record a failed delivery attempt and schedule the next one with exponential
+        back-off (or after retry_after seconds if the sink asked for it).
+        A failure that isn't retryable marks the record dead straight away.
+        Returns False if the record is now dead.
+        """
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT attempts FROM outbox WHERE id = ?", (record_id,)).fetchone()
+            if row is None:
+                return False
+            attempts = row["attempts"] + 1
+            if not retryable or attempts >= self.max_attempts:
+                self.conn.execute(
+                    "UPDATE outbox SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, str(error), record_id)
+                )
+                return False
+            delay = retry_after if retry_after is not None else min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+            self.conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (attempts, str(error), time.time() + delay, record_id)
+            )
+            return True
+
+    def next_due_in(self, now=None):
+        """Seconds until the next pending record is due, or None if nothing is pending."""
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(next_attempt_at) AS due FROM outbox WHERE status = 'pending'"
+            ).fetchone()
+        if row is None or row["due"] is None:
+            return None
+        return max(0.0, row["due"] - now)
+
+    def counts(self):
+        """Return the number of records in each status."""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def prune(self, older_than=7 * 86400):
+        """Delete delivered and dead records older than `older_than` seconds."""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM outbox WHERE status IN ('delivered', 'dead') AND created_at < ?",
+                (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,196 @@
+"""
+Replay recorded captures through the detection pipeline offline.
+
+Reads json_captures_* directories (one file per captured response, timestamped
+by modification time) and date_alert_*.json files, orders them by timestamp
+and feeds each through the same capture -> detect -> dedupe -> alert path as
+the live bot. The clock is faked to the capture's timestamp, and alerts
+go to a recording sink instead of Telegram or webhooks. Prints a JSON
+report with throughput and the alerts produced.
+
+Usage:
+    python replay.py json_captures_20250101_120000 date_alerts
+    python replay.py captures/ --realtime --speedup 60 --output replay_report.json
+"""
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sinks import NotificationSink
+
+
+class FakeClock:
+    """Clock that returns whatever time the replay last set."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingSink(NotificationSink):
+    """Sink that keeps every alert it is asked to deliver instead of sending it."""
+
+    name = "replay"
+
+    def __init__(self):
+        super().__init__(max_concurrency=1)
+        self.alerts = []
+
+    def targets(self):
+        return ["recorder"]
+
+    def send_batch(self, target, payloads):
+        self.alerts.extend(payloads)
+        return {"recorded": len(payloads)}
+
+
+def load_captures(paths, facility_by_location):
+    """
+    Collect (timestamp, source_url, body) for every capture under the given paths,
+    sorted by timestamp. Directories are searched recursively.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "**", "*.json"), recursive=True))
+        else:
+            files.append(path)
+
+    captures = []
+    for file_path in files:
+        name = os.path.basename(file_path)
+        if name in ("reported_slots.json", "telegram_subscribers.json"):
+            continue
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            continue
+
+        if name.startswith("date_alert_"):
+            # An alert file: replay the dates it reported as a days payload
+            try:
+                alert = json.loads(content)
+                timestamp = datetime.strptime(alert["timestamp"], "%Y%m%d_%H%M%S").timestamp()
+            except (ValueError, KeyError):
+                continue
+            source_url = alert.get("source_url") or ""
+            facility_id = facility_by_location.get(alert.get("location"))
+            if facility_id and "/appointment/days/" not in source_url:
+                source_url = f"https://ais.usvisa-info.com/en-ca/niv/schedule/0/appointment/days/{facility_id}.json"
+            captures.append((timestamp, source_url, json.dumps(alert.get("found_dates", []))))
+        else:
+            # A raw capture: the filename is the last path segment of the response URL
+            # plus ".json", so the bot saves days/94.json as 94.json.json
+            base = name
+            while base.endswith(".json"):
+                base = base[:-len(".json")]
+            source_url = f"https://ais.usvisa-info.com/en-ca/niv/schedule/0/appointment/days/{base}.json"
+            captures.append((os.path.getmtime(file_path), source_url, content))
+
+    captures.sort(key=lambda capture: capture[0])
+    return captures
+
+
+def replay(paths, realtime=False, speedup=1.0, end_date=None):
+    """
+    Replay the captures under `paths` and return a report dict.
+    Must be called before anything else imports main in this process.
+    """
+    paths = [os.path.abspath(path) for path in paths]
+
+    # Run the pipeline in a scratch directory with no live side effects
+    os.chdir(tempfile.mkdtemp(prefix="visabot_replay_"))
+    for variable in ("COORDINATION_DB", "OUTBOX_DB", "WEBHOOK_URLS", "CONFIG_FILE"):
+        os.environ.pop(variable, None)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["ENRICH_TIMES"] = "false"
+    main = importlib.import_module("main")
+
+    clock = FakeClock()
+    sink = RecordingSink()
+    main.clock = clock
+    main.notification_sinks = {sink.name: sink}
+    if end_date:
+        main.target_end_date = datetime.strptime(end_date, "%Y-%m-%d")
+
+    facility_by_location = {name: facility_id for facility_id, name in main.facility_id_mapping.items()}
+    captures = load_captures(paths, facility_by_location)
+    output_dir = main.create_output_directory()
+
+    started = time.perf_counter()
+    previous_ts = None
+    for index, (timestamp, source_url, body) in enumerate(captures):
+        if realtime and previous_ts is not None:
+            time.sleep(max(0.0, (timestamp - previous_ts) / speedup))
+        previous_ts = timestamp
+        clock.now = timestamp
+
+        # Capture: the same network log entry the browser would produce
+        request_id = f"replay.{index}"
+        main.process_network_log({
+            "message": json.dumps({"message": {
+                "method": "Network.responseReceived",
+                "params": {
+                    "requestId": request_id,
+                    "response": {"url": source_url, "mimeType": "application/json"}
+                }
+            }})
+        }, output_dir)
+
+        # Detect, dedupe and alert
+        while not main.json_queue.empty():
+            _, filename_base, queued_url, facility_id = main.json_queue.get_nowait()
+            main.process_captured_body(body, filename_base, queued_url, facility_id, output_dir)
+            main.json_queue.task_done()
+
+        # Deliver whatever the outbox has for the recording sink (fanning out takes a second pass)
+        while True:
+            records = main.alert_outbox.claim_due(limit=1000, now=float("inf"))
+            if not records:
+                break
+            main.deliver_outbox_records(records)
+
+    elapsed = time.perf_counter() - started
+    main.log_listener.stop()
+
+    return {
+        "payloads": len(captures),
+        "elapsed_seconds": round(elapsed, 6),
+        "payloads_per_second": round(len(captures) / elapsed, 1) if elapsed else None,
+        "first_capture": datetime.fromtimestamp(captures[0][0]).isoformat() if captures else None,
+        "last_capture": datetime.fromtimestamp(captures[-1][0]).isoformat() if captures else None,
+        "alerts": sink.alerts,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay recorded captures through the detection pipeline.")
+    parser.add_argument("paths", nargs="+", help="json_captures_* directories, date_alerts directories or files")
+    parser.add_argument("--realtime", action="store_true", help="keep the original spacing between captures")
+    parser.add_argument("--speedup", type=float, default=1.0, help="with --realtime, replay this many times faster")
+    parser.add_argument("--end-date", default=None, help="target end date (YYYY-MM-DD) to detect against")
+    parser.add_argument("--output", default=None, help="where to write the JSON report")
+    args = parser.parse_args()
+
+    output = args.output and os.path.abspath(args.output)
+    report = replay(args.paths, realtime=args.realtime, speedup=args.speedup, end_date=args.end_date)
+
+    print(f"Replayed {report['payloads']} payloads in {report['elapsed_seconds']:.3f}s "
+          f"({report['payloads_per_second']} payloads/s), {len(report['alerts'])} alert(s)")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
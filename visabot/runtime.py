@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+
+class TaskSupervisor:
+    """
+    Runs the monitor's long-lived loops as asyncio tasks and keeps them alive.
+
+    Each task is registered with a factory that returns a fresh coroutine and
+    a stall timeout. Tasks report liveness with heartbeat(); check() replaces
+    any task that has finished or crashed, or whose heartbeat is older than its
+    stall timeout, by cancelling it and starting a new one. A task that keeps
+    failing is restarted with exponential back-off (base_delay doubling up to
+    max_delay); one that ran for healthy_run seconds before failing is
+    restarted at once. stop() cancels every task and waits for them to unwind,
+    so shutdown is immediate and leaves nothing running in the background.
+    """
+
+    def __init__(self, base_delay=1, max_delay=300, healthy_run=60):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.healthy_run = healthy_run
+        self.specs = {}  # name -> (factory, stall_timeout)
+        self.tasks = {}
+        self.heartbeats = {}
+        self.progress = {}
+        self.restarts = {}
+        self.started_at = {}
+        self.failures = {}  # name -> consecutive failures
+        self.restart_at = {}  # name -> when a backed-off task is started again
+
+    def register(self, name, factory, stall_timeout=30):
+        """Register a task; factory() must return a new coroutine each time it is called."""
+        self.specs[name] = (factory, stall_timeout)
+
+    def start(self, name):
+        """Start (or replace) a registered task. Must be called from the event loop."""
+        previous = self.tasks.get(name)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        factory, _ = self.specs[name]
+        self.restart_at.pop(name, None)
+        self.started_at[name] = self.heartbeats[name] = time.time()
+        task = asyncio.get_running_loop().create_task(factory(), name=name)
+        self.tasks[name] = task
+        return task
+
+    def start_all(self):
+        for name in self.specs:
+            self.start(name)
+
+    def heartbeat(self, name, progressed=0):
+        """
+        Record that a task is alive, optionally adding to its progress counter.
+        May be called from a thread the task is waiting on.
+        """
+        self.heartbeats[name] = time.time()
+        if progressed:
+            self.progress[name] = self.progress.get(name, 0) + progressed
+
+    def check(self):
+        """
+        Restart every task that finished, crashed or stopped sending heartbeats,
+        or schedule its restart if it keeps failing. Also starts backed-off tasks
+        whose delay is up. Returns a list of (name, reason, delay) for the tasks
+        that failed since the last check, delay being 0 if it was restarted at once.
+        """
+        now = time.time()
+        failed = []
+        for name, (_, stall_timeout) in self.specs.items():
+            task = self.tasks.get(name)
+            if name in self.restart_at:
+                if now >= self.restart_at[name]:
+                    self.start(name)
+            elif task is None:
+                failed.append((name, "not running"))
+            elif task.done():
+                error = None if task.cancelled() else task.exception()
+                failed.append((name, f"crashed: {error!r}" if error else "exited"))
+            elif now - self.heartbeats.get(name, now) > stall_timeout:
+                failed.append((name, f"no heartbeat for {now - self.heartbeats[name]:.1f} seconds"))
+
+        restarted = []
+        for name, reason in failed:
+            if now - self.started_at.get(name, now) >= self.healthy_run:
+                self.failures[name] = 0
+            self.failures[name] = self.failures.get(name, 0) + 1
+            self.restarts[name] = self.restarts.get(name, 0) + 1
+            delay = 0 if self.failures[name] == 1 else min(
+                self.base_delay * 2 ** (self.failures[name] - 2), self.max_delay
+            )
+            if delay:
+                task = self.tasks.get(name)
+                if task is not None and not task.done():
+                    task.cancel()
+                self.restart_at[name] = now + delay
+            else:
+                self.start(name)
+            restarted.append((name, reason, delay))
+        return restarted
+
+    def status(self):
+        """Return a snapshot of every registered task's liveness and progress."""
+        now = time.time()
+        return {
+            name: {
+                "alive": name in self.tasks and not self.tasks[name].done(),
+                "seconds_since_heartbeat": round(now - self.heartbeats.get(name, now), 1),
+                "progress": self.progress.get(name, 0),
+                "restarts": self.restarts.get(name, 0),
+                "restart_in": round(max(0.0, self.restart_at[name] - now), 1) if name in self.restart_at else None
+            }
+            for name in self.specs
+        }
+
+    async def stop(self):
+        """Cancel every task and wait until they have all unwound."""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        # Gathering finished tasks too collects any exception they ended with
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
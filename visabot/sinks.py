@@ -0,0 +1,196 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SinkError(Exception):
+    """
+    Delivery failure reported by a sink. retry_after, if set, is how many
+    seconds the endpoint asked us to wait before trying again. retryable is
+    False for permanent failures (a rejected request or a recipient that
+    can't be reached), which retrying won't fix.
+    """
+
+    def __init__(self, message, retry_after=None, retryable=True):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+def is_retryable_status(status_code):
+    """Server errors, rate limiting and request timeouts are transient; other 4xx responses aren't."""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+class NotificationSink:
+    """
+    Destination for alert records drained from the outbox.
+
+    Each sink decides who receives a new alert (targets) and how a batch of
+    alert payloads for one target is delivered (send_batch). batch_size is the
+    most records sent in one call; batch_linger delays new records by that many
+    seconds so alerts arriving close together are delivered in one batch.
+    """
+
+    name = None
+    batch_size = 1
+    batch_linger = 0
+
+    def __init__(self, max_concurrency=4, pool_size=8, timeout=15):
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        # Keep-alive connection pool shared by every delivery to this sink
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def enabled(self):
+        return True
+
+    def targets(self):
+        """Return the recipients a new alert should be queued for."""
+        raise NotImplementedError
+
+    def send_batch(self, target, payloads):
+        """
+        Deliver a list of alert payloads to one target.
+        Returns a JSON-serializable receipt; raises SinkError on failure.
+        """
+        raise NotImplementedError
+
+    def deliver(self, target, payloads):
+        """send_batch, bounded by the sink's concurrency limit."""
+        with self.semaphore:
+            return self.send_batch(target, payloads)
+
+    def close(self):
+        self.session.close()
+
+
+class TelegramSink(NotificationSink):
+    """
+    Sends each alert's text to every subscribed chat through the Telegram Bot API.
+    The token and subscribers are read through callables so configuration
+    changes take effect without recreating the sink.
+    """
+
+    name = "telegram"
+
+    def __init__(self, get_token, get_subscribers, max_concurrency=4):
+        super().__init__(max_concurrency=max_concurrency)
+        self.get_token = get_token
+        self.get_subscribers = get_subscribers
+
+    @property
+    def enabled(self):
+        return bool(self.get_token())
+
+    def targets(self):
+        return list(self.get_subscribers())
+
+    def send_batch(self, target, payloads):
+        url = f"https://api.telegram.org/bot{self.get_token()}/sendMessage"
+        message_ids = []
+        for payload in payloads:
+            data = {
+                "chat_id": target,
+                "text": payload["text"],
+                "parse_mode": "Markdown"
+            }
+            try:
+                response = self.session.post(url, data=data, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise SinkError(f"Telegram request failed: {e}")
+            if response.status_code == 429:
+                try:
+                    retry_after = response.json().get("parameters", {}).get("retry_after")
+                except ValueError:
+                    retry_after = None
+                raise SinkError(f"Rate limited by Telegram: {response.text}", retry_after)
+            if not response.ok:
+                # e.g. 403 when the chat blocked the bot
+                raise SinkError(
+                    f"Telegram returned HTTP {response.status_code}: {response.text}",
+                    retryable=is_retryable_status(response.status_code)
+                )
+            message_ids.append(response.json().get("result", {}).get("message_id"))
+        return {"message_ids": message_ids}
+
+
+def sign_payload(secret, timestamp, body):
+    """Return the HMAC-SHA256 signature of a webhook body, as sent in X-Visabot-Signature."""
+    message = f"{timestamp}.".encode("utf-8") + body
+    return "sha256=" + hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret, timestamp, body, signature, max_age=300):
+    """
+    Check a received webhook's signature and timestamp.
+    Receivers can use this to reject forged or replayed requests.
+    """
+    try:
+        if abs(time.time() - int(timestamp)) > max_age:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), signature)
+
+
+class WebhookSink(NotificationSink):
+    """
+    POSTs batches of alerts as JSON to an HTTP endpoint.
+
+    Body: {"sink": name, "sent_at": unix time, "alerts": [payload, ...]}.
+    If a secret is configured, requests carry X-Visabot-Timestamp and
+    X-Visabot-Signature (HMAC-SHA256 over "<timestamp>.<body>").
+    """
+
+    def __init__(self, name, url, secret=None, batch_size=50, batch_linger=2,
+                 max_concurrency=2, pool_size=4, timeout=10, headers=None):
+        super().__init__(max_concurrency=max_concurrency, pool_size=pool_size, timeout=timeout)
+        self.name = name
+        self.url = url
+        self.secret = secret
+        self.batch_size = batch_size
+        self.batch_linger = batch_linger
+        self.headers = dict(headers or {})
+
+    def targets(self):
+        return [self.url]
+
+    def send_batch(self, target, payloads):
+        timestamp = str(int(time.time()))
+        body = json.dumps(
+            {"sink": self.name, "sent_at": int(timestamp), "alerts": payloads},
+            ensure_ascii=False
+        ).encode("utf-8")
+        headers = {"Content-Type": "application/json", **self.headers}
+        if self.secret:
+            headers["X-Visabot-Timestamp"] = timestamp
+            headers["X-Visabot-Signature"] = sign_payload(self.secret, timestamp, body)
+
+        try:
+            response = self.session.post(target, data=body, headers=headers, timeout=self.timeout)
+        except (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema) as e:
+            raise SinkError(f"Webhook URL is invalid: {e}", retryable=False)
+        except requests.RequestException as e:
+            raise SinkError(f"Webhook request failed: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise SinkError(
+                f"Webhook returned HTTP {response.status_code}",
+                int(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        if not response.ok:
+            raise SinkError(
+                f"Webhook returned HTTP {response.status_code}: {response.text[:200]}",
+                retryable=is_retryable_status(response.status_code)
+            )
+        return {"status": response.status_code, "batch_size": len(payloads)}
@@ -0,0 +1,108 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from browser_host import BrowserHost
+
+
+class FakeDriver:
+    """Just enough of ChromeDriver: tabs are window handles, and commands go to the current one."""
+
+    def __init__(self):
+        self.current_window_handle = "home"
+        self.targets = 0
+        self.visits = []
+        self.network_enabled = []
+        self.switch_to = SimpleNamespace(window=self._switch_window)
+
+    def _switch_window(self, handle):
+        self.current_window_handle = handle
+
+    def execute_cdp_cmd(self, command, params):
+        if command == "Target.createBrowserContext":
+            return {"browserContextId": f"context{self.targets}"}
+        if command == "Target.createTarget":
+            self.targets += 1
+            return {"targetId": f"tab{self.targets}"}
+        if command == "Network.enable":
+            self.network_enabled.append(self.current_window_handle)
+        return {}
+
+    def get(self, url):
+        self.visits.append((self.current_window_handle, url))
+
+    @property
+    def current_url(self):
+        return [url for handle, url in self.visits if handle == self.current_window_handle][-1]
+
+
+@pytest.fixture
+def host():
+    driver = FakeDriver()
+    host = BrowserHost(driver)
+    host.create_session("primary")
+    host.activate("primary")
+    return host
+
+
+def test_creating_a_session_keeps_the_driver_on_the_active_tab(host):
+    second = host.create_session("second")
+    assert host.driver.current_window_handle == host.sessions["primary"].target_id
+    # Network capture was enabled from each session's own tab
+    assert host.driver.network_enabled == [host.sessions["primary"].target_id, second.target_id]
+
+
+def test_sessions_are_driven_in_turn(host):
+    host.create_session("second")
+    primary_tab, second_tab = host.sessions["primary"].target_id, host.sessions["second"].target_id
+
+    with host.use("primary") as primary, host.use("second") as second:
+        primary.get("https://example/primary/1")
+        second.get("https://example/second/1")
+        primary.get("https://example/primary/2")
+        assert second.current_url == "https://example/second/1"
+        assert primary.current_url == "https://example/primary/2"
+
+    assert host.driver.visits == [
+        (primary_tab, "https://example/primary/1"),
+        (second_tab, "https://example/second/1"),
+        (primary_tab, "https://example/primary/2"),
+    ]
+    # The bare driver is back on the active session
+    host.driver.get("https://example/primary/3")
+    assert host.driver.visits[-1] == (primary_tab, "https://example/primary/3")
+
+
+def test_a_session_in_use_does_not_block_the_others(host):
+    host.create_session("second")
+
+    def drive_primary():
+        with host.use("primary") as primary:
+            primary.get("https://example/primary/1")
+
+    with host.use("second") as second:
+        second.get("https://example/second/1")
+        # Another thread drives its session between this session's commands
+        other = threading.Thread(target=drive_primary)
+        other.start()
+        other.join(timeout=5)
+        assert not other.is_alive()
+        second.get("https://example/second/2")
+
+    assert [url for _, url in host.driver.visits] == [
+        "https://example/second/1", "https://example/primary/1", "https://example/second/2"
+    ]
+
+
+def test_recycling_keeps_the_active_session(host):
+    host.create_session("second")
+    old_tab = host.sessions["primary"].target_id
+    host.recycle_session("primary")
+    assert host.sessions["primary"].target_id != old_tab
+    assert host.driver.current_window_handle == host.sessions["primary"].target_id
+
+    host.close_session("second")
+    with pytest.raises(ValueError):
+        with host.use("second"):
+            pass
@@ -0,0 +1,112 @@
+import logging
+import multiprocessing
+import os
+import subprocess
+import time
+
+import pytest
+
+from browser_process import (
+    BrowserProcess, ChannelLogHandler, FrameChannel, record_from_frame,
+    FRAME_CAPTURE, FRAME_LOG, FRAME_SETTINGS, FRAME_STATE, FRAME_STOP
+)
+
+
+@pytest.fixture
+def channels():
+    left, right = multiprocessing.Pipe(duplex=True)
+    yield FrameChannel(left), FrameChannel(right)
+    left.close()
+    right.close()
+
+
+def test_capture_frame_round_trip(channels):
+    sender, receiver = channels
+    body = '[{"date": "2026-12-01", "business_day": true}]'.encode("utf-8") * 1000
+    sender.send(FRAME_CAPTURE, {"filename": "94.json", "url": "https://example/days/94.json", "facility_id": "94"}, body)
+    sender.send(FRAME_STATE, {"login_active": True})
+
+    kind, meta, payload = receiver.recv()
+    assert (kind, meta["facility_id"], payload) == (FRAME_CAPTURE, "94", body)
+    # Frames without a payload don't consume the next frame
+    assert receiver.recv() == (FRAME_STATE, {"login_active": True}, b"")
+    assert not receiver.poll()
+
+
+def test_frames_are_duplex(channels):
+    detector, controller = channels
+    detector.send(FRAME_SETTINGS, {"skip_facilities": ["91"]})
+    detector.send(FRAME_STOP)
+    assert controller.recv() == (FRAME_SETTINGS, {"skip_facilities": ["91"]}, b"")
+    assert controller.recv() == (FRAME_STOP, {}, b"")
+
+
+def test_log_records_cross_as_frames(channels):
+    sender, receiver = channels
+    record = logging.makeLogRecord({
+        "name": "visabot", "levelno": logging.WARNING, "levelname": "WARNING",
+        "msg": "Login timed out", "stage": "login", "cycle_id": 7, "fields": {"facility": "89"},
+        "processName": "browser-controller", "threadName": "browser_0"
+    })
+    ChannelLogHandler(sender).emit(record)
+
+    kind, meta, _ = receiver.recv()
+    rebuilt = record_from_frame(meta)
+    assert kind == FRAME_LOG
+    assert (rebuilt.getMessage(), rebuilt.levelno, rebuilt.stage, rebuilt.fields) == (
+        "Login timed out", logging.WARNING, "login", {"facility": "89"}
+    )
+    assert rebuilt.threadName == "browser-controller/browser_0"
+
+
+def test_recv_raises_eof_when_the_other_side_is_gone(channels):
+    sender, receiver = channels
+    sender.close()
+    with pytest.raises(EOFError):
+        receiver.recv()
+
+
+def echo_controller(conn, greeting, startup):
+    channel = FrameChannel(conn)
+    channel.send(FRAME_STATE, {"greeting": greeting, "startup": startup, "pgid": os.getpgid(0)})
+    while channel.recv()[0] != FRAME_STOP:
+        pass
+
+
+def hung_controller(conn, startup):
+    # Stands in for chromedriver and Chrome: a child the controller never cleans up
+    child = subprocess.Popen(["sleep", "60"])
+    FrameChannel(conn).send(FRAME_STATE, {"child": child.pid})
+    time.sleep(60)  # Ignores the stop frame, like a hung WebDriver call
+
+
+def test_controller_process_round_trip():
+    controller = BrowserProcess(echo_controller, ("hello",))
+    channel = controller.start({"output_dir": "captures"})
+    kind, meta, _ = channel.recv()
+    assert (kind, meta["greeting"], meta["startup"]) == (FRAME_STATE, "hello", {"output_dir": "captures"})
+    # The controller leads its own process group
+    assert meta["pgid"] == controller.process.pid
+    controller.stop(timeout=10)
+    assert not controller.is_alive()
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="process groups are POSIX-only")
+def test_forced_stop_kills_the_controllers_children():
+    controller = BrowserProcess(hung_controller)
+    channel = controller.start({})
+    _, meta, _ = channel.recv()
+    controller.stop(timeout=0.5)
+
+    # The orphaned child was killed with the group (a zombie until something reaps it)
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            with open(f"/proc/{meta['child']}/stat") as f:
+                if f.read().split()[2] == "Z":
+                    break
+        except FileNotFoundError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("the controller's child survived a forced stop")
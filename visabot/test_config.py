@@ -0,0 +1,67 @@
+import importlib
+import json
+
+import pytest
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """The configuration code with a config file in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    for variable in ("COORDINATION_DB", "OUTBOX_DB", "WEBHOOK_URLS", "CONFIG_FILE"):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv("LOG_LEVEL", "ERROR")
+    module = importlib.import_module("main")
+    monkeypatch.setattr(module, "config_file", str(tmp_path / "config.json"))
+    monkeypatch.setattr(module, "config_file_mtime", None)
+    monkeypatch.setattr(module, "scheduler_settings", dict(module.scheduler_settings))
+    monkeypatch.setattr(module, "skip_facilities", list(module.skip_facilities))
+    return module
+
+
+@pytest.mark.parametrize("key, value", [
+    ("skip_facilities", 5),
+    ("relogin_minutes", None),
+    ("relogin_minutes", True),
+    ("loop_interval_seconds", "inf"),
+    ("relogin_minutes", "nan"),
+    ("browser_restart_hours", float("inf")),
+    ("target_end_date", 20261231),
+    ("alert_mode", ["new"]),
+    ("alert_threshold_date", 5),
+    ("telegram_enabled", None),
+])
+def test_wrong_types_and_non_finite_numbers_are_rejected(main, key, value):
+    with pytest.raises(ValueError):
+        main.parse_config_value(key, value)
+
+
+def test_a_bad_config_file_is_rejected_as_a_whole(main):
+    settings = dict(main.scheduler_settings)
+    with open(main.config_file, "w", encoding="utf-8") as f:
+        json.dump({"loop_interval_seconds": 30, "skip_facilities": 5}, f)
+    assert main.load_config_file(force=True) is False
+    assert main.scheduler_settings == settings
+
+    with open(main.config_file, "w", encoding="utf-8") as f:
+        f.write('{"loop_interval_seconds": 30, "relogin_minutes": null}')
+    assert main.load_config_file(force=True) is False
+    assert main.scheduler_settings == settings
+
+    with open(main.config_file, "w", encoding="utf-8") as f:
+        json.dump({"loop_interval_seconds": 30, "skip_facilities": "91"}, f)
+    assert main.load_config_file(force=True) is True
+    assert main.scheduler_settings["loop_interval"] == 30
+    assert main.skip_facilities == ["91"]
+
+
+def test_admins_can_ask_for_the_worker_status(main, monkeypatch):
+    sent = []
+    monkeypatch.setattr(main, "admin_chat_ids", {"42"})
+    monkeypatch.setattr(main, "send_message_to_chat", lambda chat_id, text: sent.append((chat_id, text)))
+    assert main.handle_admin_command("42", "/status@visabot") is True
+    status = json.loads(sent[-1][1].split("\n", 1)[1])
+    assert set(status) == {"workers", "outbox"}
+
+    assert main.handle_admin_command("7", "/status") is True
+    assert sent[-1] == ("7", "This command is restricted to administrators.")
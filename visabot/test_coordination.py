@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import pytest
+
+import coordination
+from coordination import Coordinator, HashRing, SqliteLeaseStore
+
+FACILITIES = [str(facility_id) for facility_id in range(80, 120)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake clock for the lease store, advanced by the tests."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(coordination, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteLeaseStore(str(tmp_path / "coordination.db"))
+    yield store
+    store.close()
+
+
+def test_only_one_instance_leads_until_its_lease_expires(store, clock):
+    first = Coordinator(store, "first", lease_ttl=15)
+    second = Coordinator(store, "second", lease_ttl=15)
+    first.sync()
+    second.sync()
+    assert (first.is_leader, second.is_leader) == (True, False)
+
+    # Renewals keep the lease while the leader is alive
+    clock.value += 10
+    first.sync()
+    clock.value += 10
+    assert second.sync() is False
+    assert second.is_leader is False
+
+    # The leader stops renewing: the lease expires and the other instance takes over
+    clock.value += 16
+    assert second.sync() is True
+    assert second.is_leader is True
+    first.sync()
+    assert first.is_leader is False
+
+
+def test_leaving_hands_over_immediately(store, clock):
+    first = Coordinator(store, "first")
+    second = Coordinator(store, "second")
+    first.sync()
+    second.sync()
+    first.leave()
+    second.sync()
+    assert second.is_leader is True
+    assert second.members == ["second"]
+
+
+def test_expired_members_drop_out_of_the_split(store, clock):
+    instances = [Coordinator(store, name, lease_ttl=15) for name in ("a", "b", "c")]
+    # Two rounds, so every instance has seen the others join
+    for instance in instances * 2:
+        instance.sync()
+    owned = [instance.owned_facilities(FACILITIES) for instance in instances]
+    assert sorted(sum(owned, [])) == sorted(FACILITIES)
+    assert all(owned)
+
+    # "c" stops syncing; once its membership expires the others split its facilities
+    clock.value += 16
+    for instance in instances[:2] * 2:
+        instance.sync()
+    assert instances[0].members == ["a", "b"]
+    survivors = [instance.owned_facilities(FACILITIES) for instance in instances[:2]]
+    assert sorted(sum(survivors, [])) == sorted(FACILITIES)
+    for before, after in zip(owned, survivors):
+        assert set(before) <= set(after)
+
+
+def test_hash_ring_only_moves_the_departed_members_keys():
+    before = HashRing(["a", "b", "c", "d"])
+    after = HashRing(["a", "b", "c"])
+    moved = [key for key in FACILITIES if before.owner(key) != after.owner(key)]
+    assert moved == [key for key in FACILITIES if before.owner(key) == "d"]
+    assert HashRing([]).owner("89") is None
+
+
+def test_each_alert_is_claimed_once(store, clock):
+    first = Coordinator(store, "first")
+    second = Coordinator(store, "second")
+    assert first.claim_alert("2026-12-01_Calgary") is True
+    assert second.claim_alert("2026-12-01_Calgary") is False
+    assert second.claim_alert("2026-12-02_Calgary") is True
+
+    clock.value += 31 * 86400
+    assert store.prune_claims(30 * 86400) == 2
+    assert second.claim_alert("2026-12-01_Calgary") is True
@@ -0,0 +1,92 @@
+import importlib
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from date_index import AvailabilityIndex, DateIndex
+
+DAYS_URL = "https://ais.usvisa-info.com/en-ca/niv/schedule/0/appointment/days/89.json"
+
+
+def days(*dates):
+    return [{"date": d, "business_day": True} for d in dates]
+
+
+def test_date_index_keeps_dates_sorted_and_unique():
+    index = DateIndex(["2026-06-10", "2026-06-01", "2026-06-10"])
+    assert index.dates == ["2026-06-01", "2026-06-10"]
+    assert index.add("2026-06-05") is True
+    assert index.add("2026-06-05") is False
+    assert "2026-06-05" in index
+    assert index.earliest("2026-06-02") == "2026-06-05"
+    assert index.range("2026-06-02", "2026-06-10") == ["2026-06-05", "2026-06-10"]
+    assert index.discard_before("2026-06-06") == 2
+    assert index.replace(["2026-06-10", "2026-06-20"]) == (["2026-06-20"], [])
+
+
+def test_availability_index_reports_the_previous_earliest_date():
+    index = AvailabilityIndex()
+    assert index.observe("89", ["2026-06-10", "2026-06-20"], today="2026-01-05") == (None, "2026-06-10")
+    assert index.observe("89", ["2026-06-01", "2026-06-10"], today="2026-01-05") == ("2026-06-10", "2026-06-01")
+    # Dates that have passed are dropped
+    assert index.observe("89", ["2026-06-01", "2026-06-10"], today="2026-06-02") == ("2026-06-10", "2026-06-10")
+    assert index.best() == {"89": "2026-06-10"}
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """The detection module with fresh state, a fixed clock and alerts captured instead of queued."""
+    monkeypatch.chdir(tmp_path)
+    for variable in ("COORDINATION_DB", "OUTBOX_DB", "WEBHOOK_URLS", "CONFIG_FILE"):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv("LOG_LEVEL", "ERROR")
+    module = importlib.import_module("main")
+
+    alerts = []
+    monkeypatch.setattr(module, "alerts", alerts, raising=False)
+    monkeypatch.setattr(module, "enqueue_alert", lambda message, alert=None: alerts.append((message, alert)))
+    monkeypatch.setattr(module, "notification_sinks", {"recorder": SimpleNamespace(enabled=True)})
+    monkeypatch.setattr(module, "save_reported_slots", lambda: None)
+    monkeypatch.setattr(module, "notified_dates", set())
+    monkeypatch.setattr(module, "availability_index", AvailabilityIndex())
+    monkeypatch.setattr(module, "coordinator", None)
+    monkeypatch.setattr(module, "date_alerts_dir", str(tmp_path))
+    monkeypatch.setattr(module, "clock", lambda: datetime(2026, 1, 5, 9, 0).timestamp())
+    monkeypatch.setattr(module, "target_end_date", datetime(2026, 12, 31))
+    monkeypatch.setattr(module, "alert_mode", "improvement")
+    monkeypatch.setattr(module, "alert_threshold_date", None)
+    return module
+
+
+def alerted(main, payload):
+    """Run one payload through detection and return the dates it alerted about."""
+    before = len(main.alerts)
+    main.check_for_dates_in_range(payload, DAYS_URL, "89")
+    return [alert["dates"] for _, alert in main.alerts[before:]]
+
+
+def test_improvement_mode_only_alerts_on_an_earlier_date(main):
+    assert alerted(main, days("2026-06-10", "2026-06-20")) == [["2026-06-10"]]
+    # New, but not earlier than what is already available
+    assert alerted(main, days("2026-06-10", "2026-06-15")) == []
+    # An error body says nothing about availability and must not reset the earliest date
+    assert alerted(main, {"error": "Your session expired"}) == []
+    assert alerted(main, days("2026-06-10", "2026-06-15")) == []
+
+    assert alerted(main, days("2026-06-01", "2026-06-10")) == [["2026-06-01"]]
+    message, alert = main.alerts[-1]
+    assert alert["previous_earliest"] == "2026-06-10"
+    assert "Earlier than the previous earliest date (2026-06-10)" in message
+
+
+def test_improvement_mode_alerts_on_dates_within_the_threshold(main):
+    main.alert_threshold_date = "2026-06-30"
+    assert alerted(main, days("2026-06-10")) == [["2026-06-10"]]
+    assert alerted(main, days("2026-06-10", "2026-06-25", "2026-07-15")) == [["2026-06-25"]]
+
+
+def test_new_mode_alerts_on_every_new_date(main):
+    main.alert_mode = "new"
+    assert alerted(main, days("2026-06-10", "2026-06-20")) == [["2026-06-10", "2026-06-20"]]
+    assert alerted(main, days("2026-06-10", "2026-06-15")) == [["2026-06-15"]]
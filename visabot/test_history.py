@@ -0,0 +1,88 @@
+from datetime import date
+
+import pytest
+
+from history import AvailabilityHistory, ColumnSegment, date_to_day, day_to_date
+
+
+def test_day_numbers_round_trip():
+    assert day_to_date(date_to_day("2026-12-01")) == date(2026, 12, 1)
+    assert date_to_day(date(1970, 1, 1)) == 0
+
+
+def test_segment_round_trip(tmp_path):
+    path = str(tmp_path / "obs_00000.seg")
+    columns = AvailabilityHistory.OBSERVATION_COLUMNS
+    segment = ColumnSegment(path, columns, capacity=8)
+    rows = [(1000 + i, 89 + i % 3, 20000 + i) for i in range(5)]
+    for observed, facility, slot_day in rows:
+        segment.append(observed, observed=observed, facility=facility, slot_day=slot_day)
+    segment.close()
+
+    reopened = ColumnSegment(path, columns, capacity=8)
+    assert reopened.count == 5
+    assert (reopened.first_ts, reopened.last_ts) == (1000, 1004)
+    assert list(zip(
+        reopened.column("observed").tolist(),
+        reopened.column("facility").tolist(),
+        reopened.column("slot_day").tolist(),
+    )) == rows
+    reopened.close()
+
+
+def test_segment_rejects_foreign_files(tmp_path):
+    path = tmp_path / "obs_00000.seg"
+    path.write_bytes(b"not a segment" + bytes(64))
+    with pytest.raises(ValueError):
+        ColumnSegment(str(path), AvailabilityHistory.OBSERVATION_COLUMNS, capacity=8)
+
+
+def test_history_survives_reopening_across_segments(tmp_path):
+    directory = str(tmp_path / "history")
+    history = AvailabilityHistory(directory, segment_capacity=4)
+    history.record("89", ["2026-12-01", "2026-12-03"], observed_at=1000)
+    history.record("89", ["2026-12-03", "2026-12-05", "2026-12-06"], observed_at=1060)
+    history.record("94", ["2026-11-20"], observed_at=1060)
+    history.record("89", [], observed_at=1120)
+    history.close()
+
+    reopened = AvailabilityHistory(directory, segment_capacity=4)
+    # Six observation rows over a capacity of four means a second segment file
+    assert len(reopened.observations.segments) == 2
+    assert list(reopened.iter_observations("89")) == [
+        ("89", 1000, date(2026, 12, 1)),
+        ("89", 1000, date(2026, 12, 3)),
+        ("89", 1060, date(2026, 12, 3)),
+        ("89", 1060, date(2026, 12, 5)),
+        ("89", 1060, date(2026, 12, 6)),
+    ]
+    assert reopened.count_observations() == 6
+    assert reopened.count_observations("94", start=1060, end=1061) == 1
+
+    # The available set is rebuilt from the event log
+    assert reopened.current_dates("89") == []
+    assert reopened.current_dates("94") == [date(2026, 11, 20)]
+    lifetimes = {(facility, slot): seconds for facility, slot, _, withdrawn, seconds in reopened.slot_lifetimes("89")}
+    assert lifetimes == {
+        ("89", date(2026, 12, 1)): 60,
+        ("89", date(2026, 12, 3)): 120,
+        ("89", date(2026, 12, 5)): 60,
+        ("89", date(2026, 12, 6)): 60,
+    }
+
+    # Appends continue where the previous run stopped
+    assert reopened.record("89", ["2026-12-01"], observed_at=1180) == ([date_to_day("2026-12-01")], [])
+    reopened.close()
+
+
+def test_a_clock_stepping_back_is_clamped(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / "history"), segment_capacity=4)
+    history.record("89", ["2026-12-01"], observed_at=1000)
+    # An NTP correction moves the clock back; the observation is kept at the last stored time
+    assert history.record("89", ["2026-12-01", "2026-12-03"], observed_at=940) == ([date_to_day("2026-12-03")], [])
+    history.record("89", ["2026-12-03"], observed_at=1060)
+
+    assert [observed for _, observed, _ in history.iter_observations("89")] == [1000, 1000, 1000, 1060]
+    assert history.count_observations("89", start=1000, end=1001) == 3
+    assert history.current_dates("89") == [date(2026, 12, 3)]
+    history.close()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from outbox import Outbox
+
+
+def test_instances_sharing_an_outbox_never_claim_the_same_record(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    writer = Outbox(path)
+    for index in range(200):
+        writer.enqueue("telegram", "chat", {"text": f"alert {index}"})
+
+    instances = [Outbox(path) for _ in range(4)]
+    claimed = [[] for _ in instances]
+
+    def drain(index):
+        while True:
+            records = instances[index].claim_due(limit=7)
+            if not records:
+                return
+            claimed[index].extend(record["id"] for record in records)
+
+    threads = [threading.Thread(target=drain, args=(index,)) for index in range(len(instances))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [record_id for records in claimed for record_id in records]
+    assert len(ids) == 200
+    assert len(set(ids)) == 200
+
+
+def test_opening_the_outbox_leaves_in_flight_claims_alone(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    leader = Outbox(path, claim_timeout=60, owner="leader")
+    leader.enqueue("telegram", "chat", {"text": "alert"})
+    assert len(leader.claim_due()) == 1
+
+    # Another instance starting up must not re-queue what the leader is sending
+    follower = Outbox(path, claim_timeout=60, owner="follower")
+    assert follower.claim_due() == []
+    assert follower.counts() == {"sending": 1}
+
+
+def test_stale_claims_are_retried(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    crashed = Outbox(path, claim_timeout=60, owner="crashed")
+    record_id = crashed.enqueue("telegram", "chat", {"text": "alert"})
+    crashed.claim_due()
+    with crashed.conn:
+        crashed.conn.execute("UPDATE outbox SET claimed_at = ? WHERE id = ?", (time.time() - 61, record_id))
+
+    survivor = Outbox(path, claim_timeout=60, owner="survivor")
+    assert [record["id"] for record in survivor.claim_due()] == [record_id]
+
+
+def test_a_restarted_instance_resends_its_interrupted_claims_at_once(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    crashed = Outbox(path, claim_timeout=60)
+    record_id = crashed.enqueue("telegram", "chat", {"text": "alert"})
+    crashed.claim_due()
+
+    # A single instance owns every claim, however recent
+    restarted = Outbox(path, claim_timeout=60)
+    assert [record["id"] for record in restarted.claim_due()] == [record_id]
+
+    # With coordination the restarted instance takes back only its own claims
+    shared = str(tmp_path / "shared.db")
+    crashed = Outbox(shared, claim_timeout=60, owner="a")
+    own = crashed.enqueue("telegram", "chat", {"text": "alert"})
+    crashed.claim_due()
+    other = Outbox(shared, claim_timeout=60, owner="b")
+    others = other.enqueue("telegram", "chat", {"text": "alert"})
+    other.claim_due()
+
+    restarted = Outbox(shared, claim_timeout=60, owner="a")
+    assert [record["id"] for record in restarted.claim_due()] == [own]
+    # "b" may still be sending its record
+    assert restarted.counts() == {"sending": 2}
+    assert others not in [record["id"] for record in restarted.claim_due()]
+
+
+def test_fan_out_replaces_the_record_in_one_transaction(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    broadcast = outbox.enqueue("telegram", "*", {"text": "alert"})
+    outbox.claim_due()
+
+    copies = outbox.fan_out(broadcast, [("telegram", chat, {"text": "alert"}) for chat in (1, 2)], {"recipients": 2})
+    assert outbox.counts() == {"delivered": 1, "pending": 2}
+    assert sorted((record["id"], record["target"]) for record in outbox.claim_due()) == [
+        (copies[0], "1"), (copies[1], "2")
+    ]
+
+    # A failing insert rolls back the whole fan-out, leaving the original claimed for a retry
+    second = outbox.enqueue("telegram", "*", {"text": "alert"})
+    outbox.claim_due()
+    with pytest.raises(TypeError):
+        outbox.fan_out(second, [("telegram", 1, {"text": "alert"}), ("telegram", 2, object())])
+    assert outbox.counts() == {"delivered": 1, "sending": 3}
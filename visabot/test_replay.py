@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_capture(path, dates, captured_at):
+    """Save a days payload the way the bot does (94.json.json) with the capture time as its mtime."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"date": d, "business_day": True} for d in dates], f)
+    timestamp = datetime.strptime(captured_at, "%Y-%m-%d %H:%M:%S").timestamp()
+    os.utime(path, (timestamp, timestamp))
+
+
+def run_replay(paths, output):
+    # Each run gets a fresh interpreter, as replay must import main itself
+    subprocess.run(
+        [sys.executable, os.path.join(HERE, "replay.py"), *paths, "--end-date", "2026-12-31", "--output", output],
+        check=True, cwd=HERE, capture_output=True,
+        env=dict(os.environ, LOG_LEVEL="ERROR")
+    )
+    with open(output, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_replay_is_deterministic(tmp_path):
+    captures = tmp_path / "captures"
+    write_capture(str(captures / "run1" / "94.json.json"), ["2026-06-01", "2026-06-10"], "2026-01-05 09:00:00")
+    write_capture(str(captures / "run1" / "89.json.json"), ["2026-07-01"], "2026-01-05 09:01:00")
+    write_capture(str(captures / "run2" / "94.json.json"), ["2026-05-20", "2026-06-01"], "2026-01-05 09:02:00")
+
+    first = run_replay([str(captures)], str(tmp_path / "first.json"))
+    second = run_replay([str(captures)], str(tmp_path / "second.json"))
+
+    assert first["payloads"] == second["payloads"] == 3
+    assert (first["first_capture"], first["last_capture"]) == ("2026-01-05T09:00:00", "2026-01-05T09:02:00")
+    assert first["alerts"] == second["alerts"]
+
+    # Alerts follow capture order, carry the facility parsed from the file name and the faked clock
+    assert [(alert["facility_id"], alert["dates"], alert["detected_at"]) for alert in first["alerts"]] == [
+        ("94", ["2026-06-01", "2026-06-10"], "2026-01-05T09:00:00"),
+        ("89", ["2026-07-01"], "2026-01-05T09:01:00"),
+        ("94", ["2026-05-20"], "2026-01-05T09:02:00"),
+    ]
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import runtime
+from runtime import TaskSupervisor
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake clock for the supervisor, advanced by the tests."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(runtime, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_a_crash_loop_is_restarted_with_back_off(clock):
+    starts = []
+
+    async def crashing():
+        starts.append(clock.value)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        supervisor = TaskSupervisor(base_delay=1, max_delay=4, healthy_run=60)
+        supervisor.register("crashing", crashing)
+        supervisor.start_all()
+        delays = []
+        for _ in range(40):
+            await asyncio.sleep(0)
+            delays.extend(delay for _, _, delay in supervisor.check())
+            clock.value += 0.5
+        await supervisor.stop()
+        return delays
+
+    delays = asyncio.run(scenario())
+    # The first crash is restarted at once, then the delay doubles up to max_delay
+    assert delays[:6] == [0, 1, 2, 4, 4, 4]
+    assert [later - earlier for earlier, later in zip(starts, starts[1:])][:5] == [0.5, 1.5, 2.5, 4.5, 4.5]
+
+
+def test_a_task_that_ran_healthy_is_restarted_at_once(clock):
+    async def scenario():
+        supervisor = TaskSupervisor(base_delay=1, healthy_run=60)
+        supervisor.register("hanging", lambda: asyncio.sleep(3600), stall_timeout=30)
+        supervisor.start_all()
+        delays = []
+        for _ in range(3):
+            await asyncio.sleep(0)
+            clock.value += 61
+            delays.extend(delay for _, _, delay in supervisor.check())
+        status = supervisor.status()["hanging"]
+        await supervisor.stop()
+        return delays, status
+
+    delays, status = asyncio.run(scenario())
+    assert delays == [0, 0, 0]
+    assert (status["alive"], status["restarts"], status["restart_in"]) == (True, 3, None)
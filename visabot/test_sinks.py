@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from outbox import Outbox
+from sinks import SinkError, WebhookSink, verify_signature
+
+
+class Receiver(BaseHTTPRequestHandler):
+    """Webhook endpoint that records every request it gets."""
+
+    requests = []
+    status = 200
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        Receiver.requests.append((dict(self.headers), body))
+        self.send_response(Receiver.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    Receiver.requests = []
+    Receiver.status = 200
+    server = HTTPServer(("127.0.0.1", 0), Receiver)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/hook", Receiver.requests
+    server.shutdown()
+    server.server_close()
+
+
+def deliver_due(outbox, sink, now):
+    """What the delivery worker does for one sink: claim, batch, send, mark."""
+    records = outbox.claim_due(limit=200, now=now)
+    for i in range(0, len(records), sink.batch_size):
+        batch = records[i:i + sink.batch_size]
+        receipt = sink.deliver(batch[0]["target"], [record["payload"] for record in batch])
+        for record in batch:
+            outbox.mark_delivered(record["id"], receipt)
+    return records
+
+
+def test_burst_spread_over_linger_is_sent_in_one_request(tmp_path, receiver):
+    url, requests = receiver
+    sink = WebhookSink("webhook1", url, secret="s3cret", batch_size=50, batch_linger=2)
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+
+    # Alerts of one burst arriving over the linger window become due at different moments
+    started = time.time()
+    for index, delay in enumerate((2.0, 1.5, 1.0, 0.5)):
+        outbox.enqueue(sink.name, url, {"text": f"alert {index}"}, delay=delay)
+
+    assert deliver_due(outbox, sink, now=started + 0.1) == []
+    assert len(deliver_due(outbox, sink, now=started + 1.0)) == 4
+    assert len(requests) == 1
+
+    headers, body = requests[0]
+    assert [alert["text"] for alert in json.loads(body)["alerts"]] == ["alert 0", "alert 1", "alert 2", "alert 3"]
+    assert verify_signature("s3cret", headers["X-Visabot-Timestamp"], body, headers["X-Visabot-Signature"])
+    assert outbox.counts() == {"delivered": 4}
+
+
+def test_burst_larger_than_batch_size_is_split(tmp_path, receiver):
+    url, requests = receiver
+    sink = WebhookSink("webhook1", url, batch_size=3, batch_linger=2)
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+
+    for index in range(7):
+        outbox.enqueue(sink.name, url, {"text": f"alert {index}"}, delay=sink.batch_linger)
+
+    assert len(deliver_due(outbox, sink, now=time.time() + sink.batch_linger)) == 7
+    assert [len(json.loads(body)["alerts"]) for _, body in requests] == [3, 3, 1]
+
+
+def test_retries_keep_their_back_off(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    failed = outbox.enqueue("webhook1", "target", {"text": "failed"})
+    outbox.claim_due()
+    outbox.mark_failed(failed, "HTTP 503", retry_after=60)
+    fresh = outbox.enqueue("webhook1", "target", {"text": "fresh"})
+
+    # The target's new alert is due; the one waiting to be retried is not claimed with it
+    assert [record["id"] for record in outbox.claim_due(now=time.time() + 1)] == [fresh]
+
+
+def deliver_or_fail(outbox, sink, record):
+    """What the delivery worker does with one record's outcome."""
+    try:
+        sink.deliver(record["target"], [record["payload"]])
+        outbox.mark_delivered(record["id"])
+        return True
+    except SinkError as e:
+        return outbox.mark_failed(record["id"], e, e.retry_after, e.retryable)
+
+
+@pytest.mark.parametrize("status, retried", [(400, False), (403, False), (404, False), (429, True), (503, True)])
+def test_only_transient_failures_are_retried(tmp_path, receiver, status, retried):
+    url, _ = receiver
+    Receiver.status = status
+    sink = WebhookSink("webhook1", url, batch_linger=0)
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.enqueue(sink.name, url, {"text": "alert"})
+
+    assert deliver_or_fail(outbox, sink, outbox.claim_due()[0]) is retried
+    assert outbox.counts() == {"pending" if retried else "dead": 1}
+
+
+def test_an_invalid_webhook_url_is_not_retried(tmp_path):
+    sink = WebhookSink("webhook1", "hooks.example/alerts")
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.enqueue(sink.name, sink.url, {"text": "alert"})
+
+    assert deliver_or_fail(outbox, sink, outbox.claim_due()[0]) is False
+    assert outbox.counts() == {"dead": 1}